@@ -10,6 +10,10 @@ Miniproject on L-systems (Lindenmayer systems).
 import math
 
 
+# Longest str that expand makes for the last few iterations at once.
+LEAF_SIZE = 1024
+
+
 # ----------------------------------------------------------------------
 # Example L-systems.
 # ----------------------------------------------------------------------
@@ -47,27 +51,39 @@ sierpinski_draw = {'F': 'F 1',
 # ---------------------------------------------------------------------- 
 
 
-def update(lsys, s):
+def rules_table(lsys):
+    """
+    This function takes a L-system dictionary and returns its rules as a table
+    for str.translate, mapping the code of each symbol that has a rule to the
+    str that replaces it. Symbols without a rule are left as they are.
+
+    Argument:
+    - a dictionary containg the starting string of and the rules for an L-system
+    Return Value: a dictionary mapping int symbol codes to str replacements.
+    """
+    table = {}
+    for (symbol, rule) in lsys.items():
+        if symbol != 'start':
+            assert len(symbol) == 1
+            table[ord(symbol)] = rule
+    return table
+
+
+def update(lsys, s, table=None):
     """
     This function takes a L-system dictionary and an L-system str and returns
-    the next version of the L-system str. 
+    the next version of the L-system str. Every symbol is rewritten at the
+    same time, in a single pass over the str, so it works for any rules.
 
     Argument: 
     - a dictionary containg the starting string of and the rules for an L-system 
     - an L-system str.
+    - the rules_table of the L-system, if already made.
     Return Value: a str contaiing the updated version of the L-system str argument.
     """
-    if lsys == koch:
-        new_str = s.replace('F', lsys['F'])
-    elif lsys == hilbert:
-        hold_str1 = s.replace('B', 'Z')
-        hold_str2 = hold_str1.replace('A', lsys['A'])
-        new_str = hold_str2.replace('Z', lsys['B'])
-    else:
-        hold_str1 = s.replace('G', 'Z')
-        hold_str2 = hold_str1.replace('F', lsys['F'])
-        new_str = hold_str2.replace('Z', lsys['G'])
-    return new_str
+    if table is None:
+        table = rules_table(lsys)
+    return s.translate(table)
 
 
 def iterate(lsys, n):
@@ -81,10 +97,59 @@ def iterate(lsys, n):
     - an int representing the desired number of iterations.
     Return Value: the final iteration of the L-system as a str.
     """
-    s = lsys['start']
-    for num in range(n):
-        s = update(lsys, s)
-    return s
+    if n == 0:
+        return lsys['start']
+    table = rules_table(lsys)
+    # What each symbol with a rule becomes after num + 1 iterations. Each one
+    # is made from its rule's symbols after num iterations, so only short
+    # strs are ever rewritten symbol by symbol.
+    expanded = {}
+    for num in range(n - 1):
+        expanded = {code: update(lsys, rule, expanded)
+                    for (code, rule) in table.items()}
+    return update(lsys, update(lsys, lsys['start'], table), expanded)
+
+
+def expand(lsys, n):
+    """
+    This function takes an L-system dictionary and an int number of iterations
+    and yields the symbols of that iteration one at a time, without ever
+    building the whole str. Each symbol with a rule is expanded depth first,
+    so only one partly used rule per level is kept at a time. The last few
+    levels are expanded at once through tables of what each symbol becomes,
+    as long as those stay shorter than LEAF_SIZE.
+
+    Argument:
+    - a dictionary containg the starting string of and the rules for an L-system
+    - an int representing the desired number of iterations.
+    Return Value: a generator of the single-character str symbols of the final
+    iteration, the same ones as in iterate(lsys, n).
+    """
+    table = rules_table(lsys)
+    # leaves[depth] is a rules table for 'depth' iterations at once.
+    leaves = [{}]
+    while len(leaves) <= n and table:
+        leaf = {code: update(lsys, rule, leaves[-1])
+                for (code, rule) in table.items()}
+        if max(len(value) for value in leaf.values()) > LEAF_SIZE:
+            break
+        leaves.append(leaf)
+    # Each entry is an iterator over the symbols of a str still to expand,
+    # and the number of iterations left to apply to them.
+    stack = [(iter(lsys['start']), n)]
+    while stack:
+        (symbols, depth) = stack[-1]
+        if depth < len(leaves):
+            yield from ''.join(symbols).translate(leaves[depth])
+            stack.pop()
+            continue
+        for symbol in symbols:
+            if symbol in lsys:
+                stack.append((iter(lsys[symbol]), depth - 1))
+                break
+            yield symbol
+        else:
+            stack.pop()
 
 
 def lsystem_to_drawing_commands(draw, s):
@@ -92,16 +157,23 @@ def lsystem_to_drawing_commands(draw, s):
     This function takes a dictionary of drawing instructions and an L-system string 
     and returns alist of drawing commands for that L-system.
 
+    Symbols without a drawing instruction (like A and B of the Hilbert curve) draw
+    nothing and are skipped.
+
     Argument: 
     - a dictionary whose keys are characters in L-system strings 
     and whose values are drawing commands
-    - an L-system str.
-    Return Value: a list of strings containing drawing instructions for that L-system.
+    - an L-system str, or an iterator of its symbols (e.g. from expand).
+    Return Value: a list of strings containing drawing instructions for that L-system,
+    or for an iterator, a generator of them that makes each one only when needed.
     """
+    if not isinstance(s, str):
+        return (draw[char] for char in s if char in draw)
     result = []
     for char in s:
-        value = draw[char]
-        result.append(value)
+        if char in draw:
+            value = draw[char]
+            result.append(value)
     return result
 
 
@@ -138,7 +210,8 @@ def bounds(cmds):
     This function takes a list of commands and returns the bounding cordinates
     of the resulting drawing as a tuple.
 
-    Arguments: A str list of str commands
+    Arguments: A str list of str commands, or any iterable of them, e.g. the
+    generator made by lsystem_to_drawing_commands from expand
     Return Value: a tuple containing the bounding float cordinates of the 
     drawing(xmin, xmax, ymin,ymax)
     """
@@ -163,6 +236,104 @@ def bounds(cmds):
     return (x_min, x_max, y_min, y_max)
 
 
+def segment_summary(level, s, heading, units):
+    """
+    This function takes the summaries of the symbols of a drawing at one level,
+    an L-system str and a starting heading and returns the summary of drawing
+    the str: where it ends and which way it faces relative to where it starts,
+    and the bounding box of the points it visits, relative to its start.
+
+    Arguments:
+    - a dictionary mapping each symbol to a list of its summaries, one per
+    starting heading
+    - an L-system str
+    - the int starting heading, in units of the smallest turn
+    - the int number of headings
+    Return Value: a tuple (dx, dy, turn, xmin, xmax, ymin, ymax) of floats, except
+    for the int turn.
+    """
+    x = 0.0
+    y = 0.0
+    (x_min, x_max, y_min, y_max) = (0.0, 0.0, 0.0, 0.0)
+    current = heading
+    for char in s:
+        (dx, dy, turn, x0, x1, y0, y1) = level[char][current]
+        x_min = min(x_min, x + x0)
+        x_max = max(x_max, x + x1)
+        y_min = min(y_min, y + y0)
+        y_max = max(y_max, y + y1)
+        x += dx
+        y += dy
+        current = (current + turn) % units
+    return (x, y, (current - heading) % units, x_min, x_max, y_min, y_max)
+
+
+def lsystem_bounds(lsys, draw, n):
+    """
+    This function takes an L-system dictionary, its dictionary of drawing
+    instructions and an int number of iterations and returns the bounds of the
+    drawing of that iteration, like bounds does, without expanding the L-system.
+    Instead, the summary of each symbol expanded some number of times from each
+    heading (see segment_summary) is made once from the summaries of its rule's
+    symbols one level down, so the time grows with n rather than with the length
+    of the drawing. The turning angles must be whole numbers of degrees.
+
+    Arguments:
+    - a dictionary containg the starting string of and the rules for an L-system
+    - a dictionary whose keys are characters in L-system strings
+    and whose values are drawing commands
+    - an int representing the desired number of iterations.
+    Return Value: a tuple containing the bounding float cordinates of the
+    drawing(xmin, xmax, ymin,ymax)
+    """
+    # Headings are counted in units of the largest angle that divides all the
+    # turns and a full circle.
+    step = 360
+    for cmd in draw.values():
+        move = cmd.split()
+        if move[0] in 'LR':
+            angle = float(move[1])
+            assert angle.is_integer()
+            step = math.gcd(step, int(angle))
+    units = 360 // step
+    # Summaries of the drawing commands themselves, which are also those of
+    # the symbols without a rule at every level.
+    level = {}
+    for (char, cmd) in draw.items():
+        move = cmd.split()
+        summaries = []
+        for heading in range(units):
+            if move[0] == 'L':
+                turn = int(float(move[1])) // step
+                summaries.append((0.0, 0.0, turn, 0.0, 0.0, 0.0, 0.0))
+            elif move[0] == 'R':
+                turn = -int(float(move[1])) // step
+                summaries.append((0.0, 0.0, turn, 0.0, 0.0, 0.0, 0.0))
+            else:
+                rad_angle = float(heading * step) * (math.pi / 180)
+                dx = float(move[1]) * math.cos(rad_angle)
+                dy = float(move[1]) * math.sin(rad_angle)
+                summaries.append((dx, dy, 0, min(dx, 0.0), max(dx, 0.0),
+                                  min(dy, 0.0), max(dy, 0.0)))
+        level[char] = summaries
+    # Symbols without a drawing command (like A and B of the Hilbert curve)
+    # only stand for what they are rewritten to, and draw nothing.
+    for string in lsys.values():
+        for char in string:
+            if char not in level:
+                level[char] = [(0.0, 0.0, 0, 0.0, 0.0, 0.0, 0.0)] * units
+    table = rules_table(lsys)
+    for num in range(n):
+        upper = dict(level)
+        for code in table:
+            char = chr(code)
+            upper[char] = [segment_summary(level, table[code], heading, units)
+                           for heading in range(units)]
+        level = upper
+    summary = segment_summary(level, lsys['start'], 0, units)
+    return summary[3:]
+
+
 def save_drawing(filename, bounds, cmds):
     """
     This function takes a file name str, the bounds of a drawing, and the str 
@@ -171,14 +342,14 @@ def save_drawing(filename, bounds, cmds):
     Arguments: 
     - a str file name 
     - a tuple containing float boundaries 
-    - a str list of commands
+    - a str list of commands, or any iterable of them; they are written as
+    they come, so a generator is never held in memory
     Return Value: this function has no return value
     """
-    file = open(filename, 'w')
-    file_info = f'{bounds[0]} {bounds[1]} {bounds[2]} {bounds[3]} \n'
-    for cmd in cmds:
-        file_info += f'{cmd} \n'
-    file.write(file_info)
+    with open(filename, 'w') as file:
+        file.write(f'{bounds[0]} {bounds[1]} {bounds[2]} {bounds[3]} \n')
+        for cmd in cmds:
+            file.write(f'{cmd} \n')
 
 
 def make_drawings(name, lsys, ldraw, imin, imax):
@@ -191,9 +362,10 @@ def make_drawings(name, lsys, ldraw, imin, imax):
     """
     print('Making drawings for {}...'.format(name))
     for i in range(imin, imax):
-        s = iterate(lsys, i)
-        cmds = lsystem_to_drawing_commands(ldraw, s)
-        b = bounds(cmds)
+        # The bounds come from the symbols' summaries, so the commands are
+        # only streamed once, to save them.
+        b = lsystem_bounds(lsys, ldraw, i)
+        cmds = lsystem_to_drawing_commands(ldraw, expand(lsys, i))
         save_drawing('{}_{}'.format(name, i), b, cmds)
 
 
@@ -0,0 +1,196 @@
+"""
+Thierno Diallo
+tdiallo@caltech.edu
+
+Batched Rubik's cube simulator.
+
+A RubiksBatch holds B cubes of the same size as one (B, 6*N*N) uint8 NumPy
+array laid out like RubiksFlatRep.  A move, or a different move for each
+cube, is applied to the whole batch with one fancy-index operation.
+"""
+
+import numpy as np
+from rubiks_cube import RubiksCube
+from rubiks_flat import FACES, move_tables
+
+# Move names, in the order used for move indices.
+FACE_MOVES = [face + dir for face in 'UDFBLR' for dir in '+-']
+ROTATIONS = [axis + dir for axis in 'XYZ' for dir in '+-']
+MOVES = FACE_MOVES + ROTATIONS
+
+
+class RubiksBatch:
+    """
+    This class implements RubiksCube operations over a batch of cubes.
+    """
+
+    def __init__(self, batch, size):
+        """
+        Initialize a batch of solved cubes.
+
+        Arguments:
+            - batch (int) - number of cubes
+            - size (int) - dimension of every cube (e.g. 3 for 3x3x3)
+        """
+        assert batch > 0
+        assert size > 0
+        self.size = size
+        table = move_tables(size)
+        # One row per move, in the order of MOVES.
+        self.perms = np.array([table[name] for name in MOVES], dtype=np.intp)
+        solved = np.repeat(np.arange(len(FACES), dtype=np.uint8), size * size)
+        self.states = np.tile(solved, (batch, 1))
+        # Number of moves of each cube, quarter-turn metric.
+        self.count = np.zeros(batch, dtype=np.int64)
+
+    def __len__(self):
+        """
+        Return the number of cubes in the batch.
+        """
+        return self.states.shape[0]
+
+    @classmethod
+    def from_cubes(cls, cubes):
+        """
+        Build a batch from a list of RubiksCube objects of the same size.
+        """
+        assert len(cubes) > 0
+        batch = cls(len(cubes), cubes[0].rep.size)
+        codes = {color: code for (code, color) in enumerate('wyrogb')}
+        for (i, cube) in enumerate(cubes):
+            assert cube.rep.size == batch.size
+            row = []
+            for face in FACES:
+                for colors in cube.rep.get_face(face):
+                    row.extend(codes[color] for color in colors)
+            batch.states[i] = row
+            batch.count[i] = cube.count
+        return batch
+
+    def get_cube(self, i):
+        """
+        Return cube number 'i' of the batch as a RubiksCube.
+        """
+        cube = RubiksCube(self.size, 'flat')
+        cube.rep.facelets = bytearray(self.states[i].tobytes())
+        cube.count = int(self.count[i])
+        return cube
+
+    # Basic operations.
+
+    def apply_moves(self, moves):
+        """
+        Apply moves given by index into MOVES.
+
+        Arguments:
+          moves - a single move index applied to every cube, or an
+                  array of B move indices, one per cube
+
+        Return value: none
+        """
+        moves = np.asarray(moves)
+        if moves.ndim == 0:
+            self.states = self.states[:, self.perms[moves]]
+        else:
+            assert moves.shape == (len(self),)
+            self.states = np.take_along_axis(self.states, self.perms[moves],
+                                             axis=1)
+
+    def _move_indices(self, names, dirs):
+        """
+        Turn names and directions (each a str or a sequence of B strs)
+        into move indices.
+        """
+        if isinstance(names, str) and isinstance(dirs, str):
+            return MOVES.index(names + dirs)
+        if isinstance(names, str):
+            names = [names] * len(self)
+        if isinstance(dirs, str):
+            dirs = [dirs] * len(self)
+        assert len(names) == len(self) and len(dirs) == len(self)
+        return np.array([MOVES.index(name + dir)
+                         for (name, dir) in zip(names, dirs)])
+
+    def rotate_cube(self, axis, dir):
+        """
+        Rotate the cubes as a whole.
+
+        Arguments:
+          axis - one of ['X', 'Y', 'Z'], or a sequence with one per cube
+          dir  - one of ['+', '-'], or a sequence with one per cube
+
+        Return value: none
+        """
+        self.apply_moves(self._move_indices(axis, dir))
+
+    def move_face(self, face, dir):
+        """
+        Move the specified face of every cube.
+
+        Arguments:
+          - face: one of ['U', 'D', 'L', 'R', 'F', 'B'], or a sequence
+                  with one per cube
+          - dir: '+' or '-', or a sequence with one per cube
+
+        Return value: none
+        """
+        self.apply_moves(self._move_indices(face, dir))
+        self.count += 1
+
+    def random_rotations(self, n, rng):
+        """
+        Rotate each cube randomly 'n' times.
+
+        Arguments:
+          n (int) - number of random rotations to make
+          rng - a numpy.random.Generator
+
+        Return value: none
+        """
+        first = len(FACE_MOVES)
+        for _ in range(n):
+            self.apply_moves(rng.integers(first, len(MOVES), len(self)))
+
+    def random_moves(self, n, rng):
+        """
+        Make 'n' random face moves on each cube.
+
+        Arguments:
+          n (int) - number of random moves to make
+          rng - a numpy.random.Generator
+
+        Return value: none
+        """
+        for _ in range(n):
+            self.apply_moves(rng.integers(0, len(FACE_MOVES), len(self)))
+        self.count += n
+
+    def scramble(self, nrots=10, nmoves=50, seed=None):
+        """
+        Scramble every cube independently.
+
+        Arguments:
+          nrots  - number of random cube rotations to make
+          nmoves - number of random face moves to make
+          seed   - seed for numpy.random.default_rng
+
+        Return value: none
+        """
+        rng = np.random.default_rng(seed)
+        self.random_rotations(nrots, rng)
+        self.random_moves(nmoves, rng)
+        # Reset count before solving begins.
+        self.count[:] = 0
+
+    def is_solved(self):
+        """
+        Return a boolean array telling which cubes have one color per face.
+        """
+        faces = self.states.reshape(len(self), len(FACES), -1)
+        return (faces == faces[:, :, :1]).all(axis=(1, 2))
+
+
+if __name__ == '__main__':
+    batch = RubiksBatch(10000, 3)
+    batch.scramble(seed=0)
+    print(f'{batch.is_solved().sum()} of {len(batch)} scrambled cubes solved')
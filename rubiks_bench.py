@@ -0,0 +1,141 @@
+"""
+Thierno Diallo
+tdiallo@caltech.edu
+
+Benchmarks of the Rubik's cube engines.
+
+Every benchmark is timed with timeit on a cube scrambled from a fixed
+seed, taking the best of a few repeats, and reported in operations per
+second.  Results are saved as JSON and can be compared to a saved
+baseline, so slowdowns in the move code are caught early.
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import timeit
+from rubiks_cube import RubiksCube, ENGINES
+from rubiks_control import RubiksControl
+
+SIZES = [2, 3, 5, 10, 20]
+SEED = 2024
+
+
+def scrambled_cube(size, engine):
+    """
+    Return a RubiksCube scrambled the same way every time.
+    """
+    state = random.getstate()
+    random.seed(SEED)
+    cube = RubiksCube(size, engine)
+    cube.scramble()
+    random.setstate(state)
+    return cube
+
+
+def benchmarks(size, engine):
+    """
+    Return the benchmarks of one cube size and engine.
+
+    Return value: a dictionary mapping each benchmark name to a function
+    of no arguments that does one operation
+    """
+    cube = scrambled_cube(size, engine)
+    benches = {}
+    for face in 'UDFBLR':
+        benches['move_' + face] = \
+            lambda face=face: cube.move_face(face, '+')
+
+    def rotate():
+        for axis in 'XYZ':
+            cube.rotate_cube(axis, '+')
+    benches['rotate'] = rotate
+
+    def check():
+        # A move followed by a check, as after each line of play.
+        cube.move_face('R', '+')
+        cube.is_solved()
+    benches['is_solved'] = check
+    benches['get_state'] = cube.get_state
+    benches['display'] = cube.display
+
+    control = RubiksControl(size, scramble=False, engine=engine)
+    control.exec_add_command('bench', ["r", "u", "r'", "u'"])
+    benches['macro'] = lambda: control.exec_command('bench')
+    return benches
+
+
+def run(sizes=SIZES, engines=None, repeat=3):
+    """
+    Run the benchmarks.
+
+    Arguments:
+      sizes (list) - cube sizes to measure
+      engines (list) - engine names (all of them by default)
+      repeat (int) - number of timings of each benchmark; the best counts
+
+    Return value: a dictionary mapping names like '3/flat/move_U' to
+    operations per second.  The 'rotate' benchmark does three rotations
+    per operation.
+    """
+    if engines is None:
+        engines = list(ENGINES)
+    results = {}
+    for size in sizes:
+        for engine in engines:
+            for (name, func) in benchmarks(size, engine).items():
+                timer = timeit.Timer(func)
+                (number, _) = timer.autorange()
+                best = min(timer.repeat(repeat, number)) / number
+                results[f'{size}/{engine}/{name}'] = 1 / best
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Compare results to a baseline.
+
+    Arguments:
+      results (dict) - results of run()
+      baseline (dict) - earlier results of run()
+      tolerance (float) - fraction of the baseline rate a benchmark may
+                          lose before it counts as slower
+
+    Return value: a list of (name, baseline rate, rate) tuples of the
+    benchmarks that got slower
+    """
+    slower = []
+    for (name, rate) in results.items():
+        if name in baseline and rate < baseline[name] * (1 - tolerance):
+            slower.append((name, baseline[name], rate))
+    return slower
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the cube engines.')
+    parser.add_argument('--output', help='JSON file to save the results to')
+    parser.add_argument('--baseline', help='JSON file of results to compare to')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)))
+    parser.add_argument('--engines', default=','.join(ENGINES))
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+    results = run(sizes, args.engines.split(','), args.repeat)
+    for (name, rate) in results.items():
+        print(f'{name:24} {rate:14.1f} /s')
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump({'python': sys.version.split()[0],
+                       'machine': platform.machine(),
+                       'results': results}, outfile, indent=1)
+    if args.baseline:
+        with open(args.baseline) as infile:
+            baseline = json.load(infile)['results']
+        slower = compare(results, baseline, args.tolerance)
+        for (name, before, rate) in slower:
+            print(f'SLOWER {name}: {before:.1f} -> {rate:.1f} /s')
+        if slower:
+            sys.exit(1)
@@ -5,8 +5,21 @@ tdiallo@caltech.edu
 Rubik's cube controller (interactive interface).
 """
 
-import copy  # copy for copy.deepcopy
-from rubiks_cube import RubiksCube
+import argparse  # argparse for the command-line options
+import collections  # collections.ChainMap for commands over a library
+import copy      # copy for copy.deepcopy
+import json      # json for batch checkpoints
+import sys       # sys.stdin and sys.stdout for batch runs
+from rubiks_cube import RubiksCube, InvalidCube
+import rubiks_flat  # for the move tables used to compile user commands
+import rubiks_simplify  # for simplifying command lines before they run
+import rubiks_key  # for the state keys of batch checkpoints
+import rubiks_stats  # for engine statistics
+import rubiks_render  # for cached drawing of the cube
+import rubiks_library  # for binary libraries of compiled commands
+from rubiks_simplify import LAYER_MOVE
+from rubiks_solve2 import Solver2
+from rubiks_solve3 import Solver3
 import rubiks_utils  # for rubiks_utils.user_commands
 
 
@@ -17,27 +30,80 @@ class InvalidCommand(Exception):
     pass
 
 
+def make_solver(size):
+    """
+    Return a solver for a cube size, or None if cubes of that size can't
+    be solved.  Solvers keep no state between solves, so one can serve
+    any number of controls, though only one solve at a time.
+    """
+    if size == 2:
+        return Solver2()
+    if size == 3:
+        return Solver3()
+    return None
+
+
 class RubiksControl:
     """
     This class implements an interactive Rubik's cube puzzle.
     """
 
-    def __init__(self, size, scramble=True):
+    def __init__(self, size, scramble=True, engine='list',
+                 checkpoint_interval=100, simplify=True, render=None,
+                 uniform=False, library=None, solver=None,
+                 history_limit=None):
         """
         Initialize the cube representation.
         Initialize the set of basic commands.
 
         Arguments:
-            size (int) - the size of the cube (must be 2 or 3)
+            size (int) - the size of the cube (at least 1)
                          2 means a 2x2x2 cube; 3 means a 3x3x3 cube
             scramble (bool) - True if you want the cube scrambled
+            engine (str) - cube representation, 'list' or 'flat'
+            checkpoint_interval (int) - save a full copy of the cube every
+                         this many command lines (0 to never save one)
+            simplify (bool) - True to simplify command lines, user commands
+                         and solutions before they run (see rubiks_simplify)
+            render (str) - None to draw the cube with rubiks_utils, or
+                         'net' or 'compact' to draw it with a cached
+                         rubiks_render.Renderer that redraws only the rows
+                         that changed
+            uniform (bool) - True to scramble a 2x2x2 or 3x3x3 cube to a
+                         uniformly random state instead of with random
+                         moves
+            library (rubiks_library.Library) - a library to take the user
+                         commands from instead of rubiks_utils; it may be
+                         shared by many controls, each of which stops
+                         using it on close()
+            solver (Solver2 or Solver3) - the solver for this size of
+                         cube, which may be shared by many controls; by
+                         default one is made when first needed
+            history_limit (int) - most command lines to keep for undo, or
+                         None for no limit
         """
-        if size not in [2, 3]:
-            raise ValueError('Size must be 2 or 3.')
-        self.cube = RubiksCube(size)
+        if size < 1:
+            raise ValueError('Size must be at least 1.')
+        self.cube = RubiksCube(size, engine)
+        # Journal of executed command lines, for undo and redo.  Each entry
+        # is (commands, count before, compiled user commands, checkpoint),
+        # where checkpoint is a full cube state or None.
         self.history = []
+        self.future = []
+        self.history_limit = history_limit
+        # Number of the oldest command lines dropped from the journal.
+        self.dropped = 0
+        self.checkpoint_interval = checkpoint_interval
+        self.simplify = simplify
+        # Solver for this size of cube, loaded when first needed.
+        self.solver = solver
+        # Engine statistics, once recording has been turned on.
+        self.stats = None
+        self.renderer = None
+        if render is not None:
+            self.renderer = rubiks_render.Renderer(render)
         if scramble:
-            self.cube.scramble()
+            self.cube.scramble(uniform=uniform)
 
         # Built-in commands.
         # Use lower-case for ease of typing.
@@ -46,25 +112,123 @@ class RubiksControl:
             ["u", "u'", "d", "d'", "f", "f'",
              "b", "b'", "l", "l'", "r", "r'"]
         self.rotations = ["x", "x'", "y", "y'", "z", "z'"]
+        # Built-in moves parsed so far, by command string.
+        self.parsed = {}
+        # User commands compiled to (permutation, quarter turns), and the
+        # user commands each compiled command uses directly.
+        self.compiled = {}
+        self.compiled_deps = {}
+        # Binary library the user commands were loaded from, if any.  The
+        # user commands are then a ChainMap of the commands added since
+        # and the library.
+        self.library = library
+        if library is not None:
+            self.user_commands = collections.ChainMap({}, library.share())
+            return
         # Deep-copy so util commands aren't modified.
         self.user_commands = copy.deepcopy(rubiks_utils.user_commands)
+        self.compile_all()
 
     def save_commands(self, filename):
-        """Save user commands to a file given filename (str)."""
+        """
+        Save user commands to a file given filename (str), as a binary
+        library if the name ends in '.rlib' and as text otherwise.
+        """
+        if filename.endswith('.rlib'):
+            self.save_library(filename)
+            return
         with open(filename, 'w') as outfile:
             for (cmd, contents) in self.user_commands.items():
                 print(f'{cmd} {contents}', file=outfile)
 
+    def save_library(self, filename, sizes=None):
+        """
+        Compile the user commands for some cube sizes and save them as a
+        binary library (see rubiks_library).
+
+        Arguments:
+          filename (str) - the library file
+          sizes (list) - the cube sizes to compile for (by default 2, 3
+          and the size of this cube)
+        """
+        if sizes is None:
+            sizes = sorted({2, 3, self.cube.rep.size})
+        compiled = {}
+        for size in sizes:
+            if size == self.cube.rep.size:
+                control = self
+            else:
+                control = RubiksControl(size, scramble=False,
+                                        checkpoint_interval=0,
+                                        simplify=self.simplify)
+                control.user_commands = self.user_commands
+                control.library = self.library
+                control.compiled = {}
+                control.compiled_deps = {}
+            compiled[size] = {}
+            for name in self.user_commands:
+                try:
+                    (perm, count) = control.compile_command(name)
+                except InvalidCommand:
+                    continue
+                compiled[size][name] = (perm, count, set())
+            # Every user command each command uses, directly or not.
+            for (name, (perm, count, deps)) in compiled[size].items():
+                todo = list(control.compiled_deps.get(name, ()))
+                while todo:
+                    dep = todo.pop()
+                    if dep not in deps:
+                        deps.add(dep)
+                        todo.extend(control.compiled_deps.get(dep, ()))
+        # Check before writing, since the new file takes the old one's place.
+        replacing = self.library is not None and \
+            self.library.is_file(filename)
+        rubiks_library.write_library(filename, dict(self.user_commands),
+                                     compiled, self.simplify)
+        if replacing:
+            # Read the commands from the new library from now on; it has
+            # every command, including those redefined since loading.
+            self.exec_load_commands(filename)
+
     def exec_load_commands(self, filename):
-        """Load user commands from a file given filename (str)."""
-        self.user_commands = {}
-        with open(filename) as infile:
-            for line in infile:
-                words = line.split()
-                assert len(words) >= 2
-                cmd = words[0]
-                contents = ' '.join(words[1:])
-                self.user_commands[cmd] = contents
+        """
+        Load user commands from a file given filename (str), either text
+        or a binary library.  The commands of a library are read and
+        compiled only when they are first used.  The file is read in full
+        before the current commands are replaced, so they are left alone
+        if it can't be read.
+        """
+        library = None
+        if rubiks_library.is_library(filename):
+            library = rubiks_library.Library(filename)
+            commands = collections.ChainMap({}, library)
+        else:
+            commands = {}
+            with open(filename) as infile:
+                for line in infile:
+                    words = line.split()
+                    assert len(words) >= 2
+                    cmd = words[0]
+                    contents = ' '.join(words[1:])
+                    commands[cmd] = contents
+        # Other controls may still be using the old library, so it's only
+        # closed for this one.
+        self.close()
+        self.compiled = {}
+        self.compiled_deps = {}
+        self.library = library
+        self.user_commands = commands
+        if library is None:
+            self.compile_all()
+
+    def close(self):
+        """
+        Stop using the library the user commands came from, if any.
+        """
+        if self.library is not None:
+            self.library.close()
+            self.library = None
+            self.user_commands = dict(self.user_commands.maps[0])
 
     def exec_print_commands(self):
         """
@@ -90,6 +254,183 @@ class RubiksControl:
         assert type(name) is str
         assert type(cmds) is list
         self.user_commands[name] = ' '.join(cmds)
+        self.invalidate_command(name)
+        self.compile_all()
+
+    def parse_move(self, cmd):
+        """
+        Parse a built-in move.
+
+        Arguments:
+          cmd (str) - a command string
+
+        Return value: None if the command isn't a built-in move, otherwise
+        a tuple (name, layers, dir) where name is a face ('U', 'D'...) or an
+        axis ('X', 'Y', 'Z'), layers is the list of layers moved counted
+        from the face (None for whole-cube rotations) and dir is '+' or '-'.
+        Raises InvalidCommand for a layer the cube doesn't have.
+        """
+        if cmd in self.parsed:
+            return self.parsed[cmd]
+        move = self.parse_new_move(cmd)
+        # Only moves are kept, since there are few of them for a cube but
+        # any number of other words.
+        if move is not None:
+            self.parsed[cmd] = move
+        return move
+
+    def parse_new_move(self, cmd):
+        """
+        Parse a built-in move that hasn't been parsed before; see
+        parse_move.
+        """
+        if cmd in self.rotations:
+            return (cmd[0].upper(), None, '-' if len(cmd) != 1 else '+')
+        match = LAYER_MOVE.fullmatch(cmd)
+        if match is None:
+            return None
+        (number, face, wide, prime) = match.groups()
+        if number is None:
+            number = 2 if wide else 1
+        number = int(number)
+        if number > self.cube.rep.size:
+            raise InvalidCommand(
+                f'The command, {cmd}, moves a layer the cube does not have.')
+        if wide:
+            layers = list(range(number))
+        else:
+            layers = [number - 1]
+        return (face.upper(), layers, '-' if prime else '+')
+
+    def move_perm(self, move):
+        """
+        Return the facelet permutation of a move parsed by parse_move.
+        """
+        (name, layers, dir) = move
+        size = self.cube.rep.size
+        if layers is None:
+            return rubiks_flat.move_tables(size)[name + dir]
+        perm = rubiks_flat.layer_perm(size, name, layers[0], dir)
+        for depth in layers[1:]:
+            perm = rubiks_flat.compose(
+                perm, rubiks_flat.layer_perm(size, name, depth, dir))
+        return perm
+
+    def compile_line(self, cmds, active=(), compiled=None):
+        """
+        Compile a list of commands into a single facelet permutation.
+
+        Arguments:
+          cmds (list) - the command strings to compile.
+          active (tuple) - user commands being compiled around these
+          commands, used to detect commands that expand into themselves.
+          compiled (dict) - compiled user commands to use instead of the
+          current ones, e.g. the ones in effect when a line was journaled.
+
+        Return value: a tuple (perm, count, deps) of the composed
+        permutation, the number of quarter turns it makes and the set of
+        user commands it uses directly.
+        """
+        perm = rubiks_flat.identity(self.cube.rep.size)
+        count = 0
+        deps = set()
+        for elem in cmds:
+            move = self.parse_move(elem)
+            if move is not None:
+                perm = rubiks_flat.compose(perm, self.move_perm(move))
+                if move[1] is not None:
+                    count += 1
+            elif compiled is not None and elem in compiled:
+                (sub_perm, sub_count) = compiled[elem]
+                perm = rubiks_flat.compose(perm, sub_perm)
+                count += sub_count
+            elif compiled is None and elem in self.user_commands:
+                (sub_perm, sub_count) = self.compile_command(elem, active)
+                perm = rubiks_flat.compose(perm, sub_perm)
+                count += sub_count
+                deps.add(elem)
+            else:
+                raise InvalidCommand(
+                    f'The command, {elem}, is an invalid move.')
+        return (perm, count, deps)
+
+    def compile_command(self, name, active=()):
+        """
+        Compile a user command into a single facelet permutation.
+
+        Arguments:
+          name (str) - the name of the user command to compile.
+          active (tuple) - user commands being compiled around this one,
+          used to detect commands that expand into themselves.
+
+        Return value: a tuple (perm, count) of the composed permutation and
+        the number of quarter turns it makes.
+        """
+        if name in self.compiled:
+            return self.compiled[name]
+        if name in active:
+            raise InvalidCommand(f'The command, {name}, expands into itself.')
+        if self.library is not None and \
+                self.library.simplified == self.simplify:
+            # Use the library's compiled form unless the command, or one
+            # it uses, has been redefined since the library was loaded.
+            added = self.user_commands.maps[0]
+            entry = None
+            if name not in added:
+                entry = self.library.compiled(name, self.cube.rep.size)
+            if entry is not None and not entry[2] & added.keys():
+                (perm, count, deps) = entry
+                self.compiled[name] = (perm, count)
+                self.compiled_deps[name] = deps
+                return (perm, count)
+        cmds = self.user_commands[name].split()
+        if self.simplify:
+            cmds = rubiks_simplify.simplify(cmds, self.cube.rep.size)
+        (perm, count, deps) = self.compile_line(cmds, active + (name,))
+        self.compiled[name] = (perm, count)
+        self.compiled_deps[name] = deps
+        return (perm, count)
+
+    def compile_all(self):
+        """
+        Compile every user command that is not compiled yet.
+        Commands that can't be compiled yet (e.g. they use a command that
+        isn't defined) are left to be compiled when they are executed.
+        Commands of a library are compiled already and are left alone.
+        """
+        names = self.user_commands
+        if self.library is not None:
+            names = self.user_commands.maps[0]
+        for name in list(names):
+            try:
+                self.compile_command(name)
+            except InvalidCommand:
+                pass
+
+    def invalidate_command(self, name):
+        """
+        Drop the compiled form of a user command and of every compiled
+        command that depends on it, directly or indirectly.
+
+        Arguments:
+          name (str) - the name of the user command that changed.
+        """
+        stale = {name}
+        changed = True
+        while changed:
+            changed = False
+            for (cmd, deps) in self.compiled_deps.items():
+                if cmd not in stale and deps & stale:
+                    stale.add(cmd)
+                    changed = True
+        # Build new dictionaries rather than changing the old ones, since
+        # journaled lines keep the compiled commands they were run with.
+        self.compiled = {cmd: compiled
+                         for (cmd, compiled) in self.compiled.items()
+                         if cmd not in stale}
+        self.compiled_deps = {cmd: deps
+                              for (cmd, deps) in self.compiled_deps.items()
+                              if cmd not in stale}
 
     def exec_command(self, cmd):
         """
@@ -101,43 +442,303 @@ class RubiksControl:
         Return value: none
         """
         assert type(cmd) is str
-        if cmd in self.face_moves:
-            cmd = cmd.upper()
-            if len(cmd) != 1:
-                self.cube.move_face(cmd[0], '-')
-            else:
-                self.cube.move_face(cmd, '+')
-        elif cmd in self.rotations:
-            cmd = cmd.upper()
-            if len(cmd) != 1:
-                self.cube.rotate_cube(cmd[0], '-')
-            else:
-                self.cube.rotate_cube(cmd, '+')
+        move = self.parse_move(cmd)
+        if move is not None:
+            self.exec_move(move)
         elif cmd in self.user_commands:
-            commands = self.user_commands[cmd].split()
-            for elem in commands:
-                self.exec_command(elem)
+            (perm, count) = self.compile_command(cmd)
+            self.cube.apply_perm(perm, count)
         else:
             raise InvalidCommand(f'The command, {cmd}, is an invalid move.')
 
+    def exec_move(self, move, invert=False):
+        """
+        Execute a built-in move parsed by parse_move, or its inverse.
+        A face or slice move touches only the layers it turns.
+        """
+        (name, layers, dir) = move
+        if invert:
+            dir = '-' if dir == '+' else '+'
+        if layers is None:
+            self.cube.rotate_cube(name, dir)
+        elif layers == [0]:
+            self.cube.move_face(name, dir)
+        else:
+            self.cube.move_layers(name, layers, dir)
+
+    def check_line(self, cmds):
+        """
+        Raise InvalidCommand if any command of a line is invalid, compiling
+        the user commands it uses.
+        """
+        for elem in cmds:
+            if self.parse_move(elem) is None:
+                if elem not in self.user_commands:
+                    raise InvalidCommand(
+                        f'The command, {elem}, is an invalid move.')
+                self.compile_command(elem)
+
+    def prepare_line(self, cmds):
+        """
+        Check a command line and simplify it if simplifying is on.
+
+        Return value: the list of commands to apply
+        """
+        self.check_line(cmds)
+        if self.simplify:
+            cmds = rubiks_simplify.simplify(cmds, self.cube.rep.size)
+        return cmds
+
+    def apply_line(self, cmds, compiled, invert=False):
+        """
+        Apply a checked command line to the cube one command at a time:
+        built-in moves directly and user commands as permutations.
+
+        Arguments:
+          cmds (list) - the command strings of the line
+          compiled (dict) - the compiled user commands of the line
+          invert (bool) - True to apply the inverse of the line
+        """
+        if invert:
+            cmds = reversed(cmds)
+        for elem in cmds:
+            move = self.parse_move(elem)
+            if move is not None:
+                self.exec_move(move, invert)
+            else:
+                (perm, count) = compiled[elem]
+                if invert:
+                    perm = rubiks_flat.inverse(perm)
+                self.cube.apply_perm(perm, count)
+
+    def exec_line(self, cmds):
+        """
+        Execute a command line and record it in the journal.
+        Nothing is executed if any command in the line is invalid.
+        The line is simplified first, so moves that cancel are not made
+        or counted.
+
+        Arguments:
+          cmds (list) - the command strings of the line
+
+        Return value: none
+        """
+        cmds = self.prepare_line(cmds)
+        checkpoint = None
+        if self.checkpoint_interval and \
+                (self.dropped + len(self.history)) % \
+                self.checkpoint_interval == 0:
+            checkpoint = self.cube.get_state()
+        self.history.append(
+            (tuple(cmds), self.cube.count, self.compiled, checkpoint))
+        if self.history_limit is not None and \
+                len(self.history) > self.history_limit:
+            # Older lines are undone without them, so they can go.
+            del self.history[0]
+            self.dropped += 1
+        self.future = []
+        self.apply_line(cmds, self.compiled)
 
     def undo_command(self):
         """
         Undo the last move(s), restoring the previous state.
+        The moves are undone by applying their inverse unless a checkpoint
+        was saved before them.
         """
         if self.history == []:
             raise InvalidCommand('No moves to undo!')
-        (rep, count) = self.history.pop()
-        self.cube.put_state(rep, count)
+        entry = self.history.pop()
+        (cmds, count, compiled, checkpoint) = entry
+        if checkpoint is not None:
+            # Copy so later moves don't change the saved checkpoint.
+            (rep, _) = checkpoint
+            self.cube.put_state(copy.deepcopy(rep), count)
+        else:
+            self.apply_line(cmds, compiled, invert=True)
+            self.cube.count = count
+        self.future.append(entry)
+
+    def redo_command(self):
+        """
+        Redo the last undone move(s).
+        """
+        if self.future == []:
+            raise InvalidCommand('No moves to redo!')
+        entry = self.future.pop()
+        (cmds, _, compiled, _) = entry
+        self.apply_line(cmds, compiled)
+        self.history.append(entry)
+
+    def order(self, cmds):
+        """
+        Find how many times a command line must be repeated to bring the
+        cube back to where it started, from the cycles of its compiled
+        permutation.
+
+        Arguments:
+          cmds (list) - the command strings of the line
+
+        Return value: a tuple (order, cycles) where cycles maps each
+        sticker cycle length (other than 1) to the number of such cycles
+        """
+        (perm, _, _) = self.compile_line(cmds)
+        return (rubiks_flat.order(perm), rubiks_flat.cycle_type(perm))
+
+    def exec_print_order(self, cmds):
+        """
+        Print the order and sticker cycles of a command line, or of every
+        user command if the line is empty, in the format:
+        <cmds> : order <order>, cycles <count>x<length> ...
+        """
+        if cmds == []:
+            lines = [[name] for name in self.user_commands]
+        else:
+            lines = [cmds]
+        for line in lines:
+            try:
+                (order, cycles) = self.order(line)
+            except InvalidCommand as err:
+                print(f'{" ".join(line)} : {err}')
+                continue
+            lengths = sorted(cycles, reverse=True)
+            structure = ' '.join(f'{cycles[n]}x{n}' for n in lengths)
+            print(f'{" ".join(line)} : order {order}, cycles {structure}')
+
+    def exec_stats(self, args):
+        """
+        Turn recording of engine statistics on or off, forget them, or
+        print them.  Recording is process wide (see rubiks_stats): 'on'
+        joins the recording already going on, if any, so every control
+        that turned it on shares the same counts, which include every
+        cube, and 'off' stops it for all of them.
+
+        Arguments:
+          args (list) - ['on'], ['off'], ['reset'] or [] to print them
+        """
+        if args == ['on']:
+            if rubiks_stats.recording():
+                self.stats = rubiks_stats.current()
+            else:
+                if self.stats is None:
+                    self.stats = rubiks_stats.Stats()
+                rubiks_stats.start(self.stats)
+        elif args == ['off']:
+            rubiks_stats.stop()
+        elif args == ['reset']:
+            if self.stats is not None:
+                self.stats.reset()
+        elif args == []:
+            if self.stats is None:
+                print("Statistics are off; use 'stats on'.")
+            else:
+                print(self.stats.report())
+        else:
+            raise InvalidCommand('Usage: stats [on | off | reset]')
+
+    def solution(self):
+        """
+        Return a list of commands that solves the cube from its current
+        state, without changing the cube, or None if the solver found
+        none.  Raises InvalidCube if the cube can't be solved.
+        """
+        if self.cube.rep.size not in [2, 3]:
+            raise InvalidCommand('Only 2x2x2 and 3x3x3 cubes can be solved.')
+        if self.solver is None:
+            self.solver = make_solver(self.cube.rep.size)
+        cmds = self.solver.solve(self.cube)
+        if cmds is not None and self.simplify:
+            # The solved cube may be left in any orientation.
+            cmds = rubiks_simplify.simplify(cmds, self.cube.rep.size,
+                                            rotations=False)
+        return cmds
+
+    def checkpoint(self, fields):
+        """
+        Return a dictionary of the requested facts about the cube: any of
+        'count' (the move count), 'solved' (True if solved) and 'key' (the
+        canonical state key from rubiks_key).
+        """
+        record = {}
+        for field in fields:
+            if field == 'count':
+                record['count'] = self.cube.count
+            elif field == 'solved':
+                record['solved'] = self.cube.is_solved()
+            elif field == 'key':
+                record['key'] = rubiks_key.state_key(self.cube.rep)
+            else:
+                raise ValueError(f'Unknown checkpoint field: {field}')
+        return record
+
+    def run(self, lines, outfile=None, fields=('count', 'solved', 'key')):
+        """
+        Run a command script without displaying the cube or journaling
+        anything, so scripts of any length can be streamed through.
+
+        Each line is a command line as in play, a user command definition
+        (name : cmds), 'load <filename>', 'stats on' or 'stats off',
+        'check' to write a checkpoint, 'stats' to write the statistics or
+        'q' to stop.  A checkpoint is also written at the end.  Checkpoints
+        are written as JSON objects, one per line, holding the line number
+        and the requested fields; invalid lines are reported the same way
+        with an 'error' instead, and skipped.
+
+        Arguments:
+          lines - an iterable of lines, e.g. an open file or sys.stdin
+          outfile - file to write checkpoints to (sys.stdout by default)
+          fields (tuple) - the checkpoint fields (see checkpoint())
+        """
+        if outfile is None:
+            outfile = sys.stdout
+        number = 0
+        for (number, line) in enumerate(lines, 1):
+            cmds = line.split()
+            if len(cmds) < 1:
+                continue
+            if cmds[0] in ['q', 'quit']:
+                break
+            try:
+                if len(cmds) == 1 and cmds[0] == 'check':
+                    record = {'line': number}
+                    record.update(self.checkpoint(fields))
+                    print(json.dumps(record), file=outfile)
+                elif len(cmds) == 2 and cmds[0] == 'load':
+                    self.exec_load_commands(cmds[1])
+                elif len(cmds) == 1 and cmds[0] == 'stats':
+                    counts = {} if self.stats is None else self.stats.counts
+                    print(json.dumps({'line': number, 'stats': counts}),
+                          file=outfile)
+                elif cmds[0] == 'stats':
+                    self.exec_stats(cmds[1:])
+                elif len(cmds) > 2 and cmds[1] == ':':
+                    self.exec_add_command(cmds[0], cmds[2:])
+                else:
+                    self.apply_line(self.prepare_line(cmds), self.compiled)
+            except InvalidCommand as err:
+                record = {'line': number, 'error': str(err)}
+                print(json.dumps(record), file=outfile)
+        record = {'line': number}
+        record.update(self.checkpoint(fields))
+        print(json.dumps(record), file=outfile)
+
+    def display(self):
+        """
+        Return a string version of the cube, drawn by rubiks_utils or by
+        the cached renderer.
+        """
+        if self.renderer is None:
+            return self.cube.display()
+        return self.renderer.render(self.cube.rep)
 
     def play(self, check_solved=True):
         """Interactively solve Rubik's cube."""
 
         while True:
-            print(self.cube.display())
+            print(self.display())
             print(f'Move count: {self.cube.count}\n')
 
             if check_solved and self.cube.is_solved():
+                self.cube.validate()
                 print('SOLVED!')
                 break
 
@@ -155,6 +756,10 @@ class RubiksControl:
                 if len(cmds) == 1 and cmds[0] in ['-', 'undo']:
                     self.undo_command()
 
+                # Redo an undone move.
+                elif len(cmds) == 1 and cmds[0] in ['+', 'redo']:
+                    self.redo_command()
+
                 # Save the commands to a file.
                 elif len(cmds) == 2 and cmds[0] == 'save':
                     self.save_commands(cmds[1])
@@ -163,6 +768,22 @@ class RubiksControl:
                 elif len(cmds) == 2 and cmds[0] == 'load':
                     self.exec_load_commands(cmds[1])
 
+                # Print a solution of the cube.
+                elif len(cmds) == 1 and cmds[0] == 'solve':
+                    solution = self.solution()
+                    if solution is None:
+                        print('No solution was found.')
+                    else:
+                        print(' '.join(solution))
+
+                # Print the order of a line, or of all commands.
+                elif cmds[0] == 'order':
+                    self.exec_print_order(cmds[1:])
+
+                # Record or print engine statistics.
+                elif cmds[0] == 'stats':
+                    self.exec_stats(cmds[1:])
+
                 # Print all commands.
                 elif len(cmds) == 1 and cmds[0] == 'cmds':
                     self.exec_print_commands()
@@ -172,21 +793,49 @@ class RubiksControl:
                     self.exec_add_command(cmds[0], cmds[2:])
 
                 else:
-                    # Save the cube state before moving.
-                    self.history.append(self.cube.get_state())
-
-                    for subcmd in cmds:
-                        self.exec_command(subcmd)
+                    self.exec_line(cmds)
 
             except InvalidCommand as err:
                 print(f'Invalid command line: {cmd}')
                 print(err)
 
+            except InvalidCube as err:
+                print(err)
+
 
 if __name__ == '__main__':
-    # Leave 'scramble' as True normally.
-    # Make it False if you want to test rotations on a solved cube.
-    scramble = True
-    check_solved = scramble
-    cube = RubiksControl(3, scramble)
-    cube.play(check_solved)
+    parser = argparse.ArgumentParser(description="Play a Rubik's cube.")
+    parser.add_argument('--size', type=int, default=3)
+    parser.add_argument('--engine', default='list', choices=['list', 'flat'])
+    parser.add_argument('--batch', metavar='FILE',
+                        help="run a command script ('-' for standard "
+                             'input) on a solved cube instead of playing')
+    parser.add_argument('--fields', default='count,solved,key',
+                        help='checkpoint fields for --batch')
+    parser.add_argument('--no-simplify', action='store_true',
+                        help='run command lines exactly as written')
+    parser.add_argument('--render', choices=rubiks_render.STYLES,
+                        help='draw the cube with the cached renderer')
+    parser.add_argument('--uniform', action='store_true',
+                        help='scramble to a uniformly random state '
+                             '(2x2x2 and 3x3x3 only)')
+    args = parser.parse_args()
+    if args.batch is None:
+        # Leave 'scramble' as True normally.
+        # Make it False if you want to test rotations on a solved cube.
+        scramble = True
+        check_solved = scramble
+        cube = RubiksControl(args.size, scramble, args.engine,
+                             simplify=not args.no_simplify,
+                             render=args.render, uniform=args.uniform)
+        cube.play(check_solved)
+    else:
+        cube = RubiksControl(args.size, False, args.engine,
+                             checkpoint_interval=0,
+                             simplify=not args.no_simplify)
+        fields = args.fields.split(',')
+        if args.batch == '-':
+            cube.run(sys.stdin, fields=fields)
+        else:
+            with open(args.batch) as infile:
+                cube.run(infile, fields=fields)
@@ -8,6 +8,13 @@ Rubik's cube class to manage a cube state and moves.
 import copy    # copy for copy.deepcopy
 import random  # random for random.choice
 from rubiks_rep import RubiksRep
+from rubiks_flat import RubiksFlatRep, COLORS
+
+# Available cube representations, selected by name.
+ENGINES = {'list': RubiksRep, 'flat': RubiksFlatRep}
+
+# Translation from color codes to color letters.
+_letters = bytes.maketrans(bytes(range(len(COLORS))), COLORS.encode())
 
 
 class InvalidCube(Exception):
@@ -23,15 +30,19 @@ class RubiksCube:
     This class implements all Rubik's cube operations.
     """
 
-    def __init__(self, size):
+    def __init__(self, size, engine='list'):
         """
         Initialize the cube representation with a given size.
 
-        Argument:
+        Arguments:
             - size (int) - dimension of cube (e.g. 3 for 3x3x3)
+            - engine (str) - 'list' for the nested-list representation or
+                             'flat' for the flat permutation-table one
         """
+        assert engine in ENGINES
         # Cube representation.
-        self.rep = RubiksRep(size)
+        self.engine = engine
+        self.rep = ENGINES[engine](size)
         # Number of moves, quarter-turn metric.
         self.count = 0
 
@@ -68,16 +79,7 @@ class RubiksCube:
         """
         assert axis in ['X', 'Y', 'Z']
         assert dir in ['+', '-']
-        direction = {'+': 1, '-': 3}
-        if axis == 'X':
-            for num in range(0, direction[dir]):
-                self.rep.rotate_cube_x()
-        elif axis == 'Y':
-            for num in range(0, direction[dir]):
-                self.rep.rotate_cube_y()
-        elif axis == 'Z':
-            for num in range(0, direction[dir]):
-                self.rep.rotate_cube_z()
+        self.rep.rotate_cube(axis, dir)
 
     def move_face(self, face, dir):
         """
@@ -91,39 +93,42 @@ class RubiksCube:
         """
         assert face in ['U', 'D', 'F', 'B', 'L', 'R']
         assert dir in ['+', '-']
-        dic = {'+': 1, '-': 3}
-        if face == 'U':
-            self.rotate_cube('X', '-')
-            for num in range(0, dic[dir]):
-                self.rep.move_front()
-            self.rotate_cube('X', '+')
-        elif face == 'D':
-            self.rotate_cube('X', '+')
-            for num in range(0, dic[dir]):
-                self.rep.move_front()
-            self.rotate_cube('X', '-')
-        elif face == 'B':
-            self.rotate_cube('X', '-')
-            self.rotate_cube('X', '-')
-            for num in range(0, dic[dir]):
-                self.rep.move_front()
-            self.rotate_cube('X', '+')
-            self.rotate_cube('X', '+')
-        elif face == 'L':
-            self.rotate_cube('Y', '-')
-            for num in range(0, dic[dir]):
-                self.rep.move_front()
-            self.rotate_cube('Y', '+')
-        elif face == 'R':
-            self.rotate_cube('Y', '+')
-            for num in range(0, dic[dir]):
-                self.rep.move_front()
-            self.rotate_cube('Y', '-')
-        else:
-            for num in range(0, dic[dir]):
-                self.rep.move_front()
+        self.rep.move_face(face, dir)
+        self.count += 1
+
+    def move_layers(self, face, layers, dir):
+        """
+        Move one or more layers of the cube together, as seen from the
+        specified face.  This counts as a single move.
+
+        Arguments:
+          - face (str): one of ['U', 'D', 'L', 'R', 'F', 'B']
+          - layers (list): the layers to move, counted from that face
+                           (0 is the face itself, 1 the slice behind it...)
+          - dir  (str): '+' for clockwise or '-' for counterclockwise
+
+        Return value: none
+        """
+        assert face in ['U', 'D', 'F', 'B', 'L', 'R']
+        assert dir in ['+', '-']
+        for depth in layers:
+            assert 0 <= depth < self.rep.size
+            self.rep.move_layer(face, depth, dir)
         self.count += 1
 
+    def apply_perm(self, perm, count):
+        """
+        Apply a precompiled move sequence in one step.
+
+        Arguments:
+          perm (tuple) - facelet permutation of the whole sequence
+          count (int) - number of quarter turns in the sequence
+
+        Return value: none
+        """
+        self.rep.apply_perm(perm)
+        self.count += count
+
     def random_rotations(self, n):
         """
         Rotate the entire cube randomly 'n' times.
@@ -140,7 +145,8 @@ class RubiksCube:
 
     def random_moves(self, n):
         """
-        Make 'n' random moves.
+        Make 'n' random moves.  Cubes bigger than 3x3x3 also get random
+        inner slice moves, since face moves alone never mix their centers.
 
         Arguments:
           n (int) - number of random moves to make
@@ -150,39 +156,70 @@ class RubiksCube:
         for _ in range(0, n):
             face = random.choice('UDFBLR')
             dir = random.choice('+-')
-            self.move_face(face, dir)
+            if self.rep.size > 3:
+                depth = random.randrange(self.rep.size)
+                self.move_layers(face, [depth], dir)
+            else:
+                self.move_face(face, dir)
 
-    def scramble(self, nrots=10, nmoves=50):
+    def scramble(self, nrots=10, nmoves=50, uniform=False):
         """
         Scramble the cube.
 
         Arguments:
           nrots  - number of random cube rotations to make
           nmoves - number of random face moves to make
+          uniform - True to draw a uniformly random state of a 2x2x2 or
+                    3x3x3 cube directly instead of making random moves
 
         Return value: none
         """
 
-        self.random_rotations(nrots)
-        self.random_moves(nmoves)
+        if uniform:
+            # Imported here since rubiks_cubies imports this module.
+            import rubiks_cubies
+            if self.rep.size not in [2, 3]:
+                raise ValueError('Uniform scrambles need a 2x2x2 or 3x3x3 cube.')
+            codes = rubiks_cubies.random_facelets(self.rep.size)
+            self.rep.load_colors(codes.translate(_letters).decode())
+        else:
+            self.random_rotations(nrots)
+            self.random_moves(nmoves)
         # Reset count before solving begins.
         self.count = 0
 
     def is_solved(self):
         """
-        Return True if the cube is solved.
+        Return True if the cube is solved, i.e. every face has a single
+        color.  Either engine only rechecks the faces changed since the
+        last check, so a check after a move doesn't read the whole cube.
+
+        This does not check that the cube is valid; see validate().
+        """
+        return self.rep.is_solved()
 
-        If the cube appears solved but is invalid, raise an
-        InvalidCube exception with an appropriate error message.
+    def validate(self):
         """
+        Check the colors of the cube, raising an InvalidCube exception
+        with an appropriate error message if they are invalid.
 
+        Every sticker must have a valid color.  If the cube is solved, it
+        must also show all six colors, with opposite faces o and r, g and b,
+        w and y, and must not be a mirror image.
+        """
         # Criteria:
         # - all faces must have only one color
         # - all colors are represented
         # - opposite faces: o and r, g and b, w and y
         # - w face adjacent to g and r
-        # FIX
-        color_lst = []
+        for face in 'UDFBLR':
+            for row in self.rep.get_face(face):
+                for color in row:
+                    if color not in 'wyrogb':
+                        raise InvalidCube(
+                            'An invalid color was found on the cube.')
+        if not self.is_solved():
+            return
         apposits_clr = {'o': 'r', 'g': 'b',
                         'w': 'y', 'r': 'o', 'b': 'g', 'y': 'w'}
         apposits_sides = {'F': 'B', 'D': 'U', 'R': 'L'}
@@ -194,32 +231,16 @@ class RubiksCube:
             'bwr', 'bry', 'byo', 'bow',
             'owb', 'oby', 'oyg', 'ogw'
             ]
-        for color in self.rep.face_contents:
-            face_lst = []
-            face = self.rep.get_face(color)
-            for row in face:
-                for elem in row:
-                    if elem not in face_lst:
-                        face_lst.append(elem)
-            if len(face_lst) != 1:
-                return False
-            color_lst.append(face_lst[0])
-        for color in color_lst:
-            if color not in 'wyrogb':
-                raise InvalidCube('An invalid color was found on the cube.')
+        color_lst = []
+        for face in 'UDFBLR':
+            color = self.rep.get_face(face)[0][0]
+            if color not in color_lst:
+                color_lst.append(color)
         if len(color_lst) != 6:
             raise InvalidCube('Your cube does not contain all six colors.')
         for side in apposits_sides:
-            opp_color = (
-            apposits_clr[self.rep.get_face(side)
-            [random.randint(0, self.rep.size - 1)]
-            [random.randint(0, self.rep.size - 1)]]
-            )
-            face_color = (
-            self.rep.get_face(apposits_sides[side])
-            [random.randint(0, self.rep.size - 1)]
-            [random.randint(0, self.rep.size - 1)]
-            )
+            opp_color = apposits_clr[self.rep.get_face(side)[0][0]]
+            face_color = self.rep.get_face(apposits_sides[side])[0][0]
             if opp_color != face_color:
                 raise InvalidCube('Not all opposite sides have their ' +
                 'supposed opposite color.')
@@ -228,7 +249,6 @@ class RubiksCube:
         if cubie not in possible_cubes:
             raise InvalidCube('The cube is a mirror image of' +
                               ' what it should be.')
-        return True
 
     def display(self):
         """
@@ -238,8 +258,31 @@ class RubiksCube:
         return self.rep.display()
 
 
+def move_costs(size, engine='list'):
+    """
+    Measure the cost of a single quarter turn of every face.
+
+    Arguments:
+      size (int) - dimension of cube
+      engine (str) - cube representation to measure
+
+    Return value: a dictionary mapping moves like 'U+' to the number
+    of stickers the representation copied to make that move
+    """
+    costs = {}
+    for face in 'UDFBLR':
+        for dir in '+-':
+            cube = RubiksCube(size, engine)
+            before = cube.rep.touched
+            cube.move_face(face, dir)
+            costs[face + dir] = cube.rep.touched - before
+    return costs
+
+
 if __name__ == '__main__':
     cube = RubiksCube(3)
     print(cube.display())
     cube.scramble()
     print(cube.display())
+    for size in [2, 3]:
+        print(f'{size}x{size} stickers copied per move:', move_costs(size))
@@ -0,0 +1,385 @@
+"""
+Thierno Diallo
+tdiallo@caltech.edu
+
+Cubie-level view of 2x2x2 and 3x3x3 cubes.
+
+Converts between the flat facelet layout of RubiksFlatRep and a cubie
+description (which corner or edge sits in each position, and how it is
+twisted or flipped), and provides the whole-cube rotations and the
+coordinate encodings used by the solvers.
+"""
+
+import math    # math.factorial for the number of permutations
+import os
+import random  # random as the default random number generator
+from rubiks_cube import InvalidCube
+from rubiks_flat import FACES, COLORS, compose, identity, move_tables
+
+# Where the solvers keep their generated tables.
+TABLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'rubiks_tables')
+
+# Corner and edge positions, each named by its faces in clockwise order
+# starting from the U or D face (the F or B face for the middle edges).
+CORNERS = ['URF', 'UFL', 'ULB', 'UBR', 'DFR', 'DLF', 'DBL', 'DRB']
+EDGES = ['UR', 'UF', 'UL', 'UB', 'DR', 'DF', 'DL', 'DB',
+         'FR', 'FL', 'BL', 'BR']
+
+# Geometry and rotations, computed once per cube size.
+_cache = {}
+
+
+def signatures(size):
+    """
+    Return, for each facelet, the set of faces of the cubie it belongs to.
+    A facelet belongs to a face's layer if turning that face moves it.
+    """
+    table = move_tables(size)
+    area = size * size
+    sigs = []
+    for i in range(6 * area):
+        sig = {FACES[i // area]}
+        for face in FACES:
+            if table[face + '+'][i] != i:
+                sig.add(face)
+        sigs.append(frozenset(sig))
+    return sigs
+
+
+def _find_facelet(size, sigs, face, faces):
+    """
+    Return the only facelet on 'face' whose cubie has exactly 'faces'.
+    """
+    area = size * size
+    start = FACES.index(face) * area
+    found = [i for i in range(start, start + area) if sigs[i] == set(faces)]
+    assert len(found) == 1
+    return found[0]
+
+
+def geometry(size):
+    """
+    Return the facelets of each corner and edge position of a cube.
+
+    Arguments:
+      size (int) - 2 or 3
+
+    Return value: a tuple (corners, edges) where corners is a list of
+    eight tuples of three facelet indices, in the face order of CORNERS,
+    and edges is a list of twelve pairs of facelet indices in the face
+    order of EDGES (empty for a 2x2x2 cube).
+    """
+    assert size in [2, 3]
+    key = ('geometry', size)
+    if key not in _cache:
+        sigs = signatures(size)
+        corners = []
+        for name in CORNERS:
+            corners.append(tuple(_find_facelet(size, sigs, face, name)
+                                 for face in name))
+        edges = []
+        if size == 3:
+            for name in EDGES:
+                edges.append(tuple(_find_facelet(size, sigs, face, name)
+                                   for face in name))
+        _cache[key] = (corners, edges)
+    return _cache[key]
+
+
+def rotations(size):
+    """
+    Return the 24 whole-cube rotations of a cube of the given size.
+
+    Return value: a list of (perm, word) pairs, where perm is the facelet
+    permutation of the rotation and word is a shortest list of rotation
+    commands (e.g. ["x", "y'"]) that performs it.  The identity is first.
+    """
+    key = ('rotations', size)
+    if key not in _cache:
+        table = move_tables(size)
+        start = identity(size)
+        found = {start: []}
+        order = [start]
+        for perm in order:
+            for axis in 'XYZ':
+                for dir in '+-':
+                    nxt = compose(perm, table[axis + dir])
+                    if nxt not in found:
+                        cmd = axis.lower() + ("'" if dir == '-' else '')
+                        found[nxt] = found[perm] + [cmd]
+                        order.append(nxt)
+        assert len(order) == 24
+        _cache[key] = [(perm, found[perm]) for perm in order]
+    return _cache[key]
+
+
+def cube_facelets(cube):
+    """
+    Return the facelets of a RubiksCube as a bytes object of color codes,
+    in the layout of RubiksFlatRep (0 for 'w', 1 for 'y', ...).
+    """
+    codes = []
+    for face in FACES:
+        for row in cube.rep.get_face(face):
+            for color in row:
+                if color not in COLORS:
+                    raise InvalidCube('An invalid color was found on the cube.')
+                codes.append(COLORS.index(color))
+    return bytes(codes)
+
+
+def gather(facelets, perm):
+    """
+    Apply a facelet permutation to a bytes object of facelets.
+    """
+    return bytes(facelets[i] for i in perm)
+
+
+# Cubie descriptions.
+
+def cubie_moves(size):
+    """
+    Return the effect of each face move on the cubies of a cube.
+
+    Return value: a dictionary mapping each move (e.g. 'U+') to a tuple
+    (cperm, ctwist, eperm, eflip) meaning that after the move, corner
+    position i holds what was in position cperm[i], twisted by ctwist[i],
+    and edge position i holds what was in position eperm[i], flipped by
+    eflip[i].
+    """
+    key = ('cubie_moves', size)
+    if key not in _cache:
+        (corners, edges) = geometry(size)
+        where = {}
+        for places in [corners, edges]:
+            for (pos, facelets) in enumerate(places):
+                for (k, i) in enumerate(facelets):
+                    where[i] = (pos, k)
+        table = move_tables(size)
+        actions = {}
+        for face in FACES:
+            for dir in '+-':
+                perm = table[face + dir]
+                (cperm, ctwist, eperm, eflip) = ([], [], [], [])
+                for facelets in corners:
+                    (pos, k) = where[perm[facelets[0]]]
+                    cperm.append(pos)
+                    ctwist.append(-k % 3)
+                for facelets in edges:
+                    (pos, k) = where[perm[facelets[0]]]
+                    eperm.append(pos)
+                    eflip.append(k)
+                actions[face + dir] = (cperm, ctwist, eperm, eflip)
+        _cache[key] = actions
+    return _cache[key]
+
+
+def move_cubies(state, action):
+    """
+    Return the cubie state (cp, co, ep, eo) after a move, given the move's
+    entry of cubie_moves().
+    """
+    (cp, co, ep, eo) = state
+    (cperm, ctwist, eperm, eflip) = action
+    return ([cp[i] for i in cperm],
+            [(co[i] + t) % 3 for (i, t) in zip(cperm, ctwist)],
+            [ep[i] for i in eperm],
+            [(eo[i] + f) % 2 for (i, f) in zip(eperm, eflip)])
+
+
+def to_cubies(size, facelets):
+    """
+    Describe the facelets of a cube by its cubies.
+
+    Arguments:
+      size (int) - 2 or 3
+      facelets (bytes) - color codes in the layout of RubiksFlatRep
+
+    Return value: a tuple (cp, co, ep, eo) where cp[i] is the corner in
+    position i, co[i] its twist (0, 1 or 2), ep[i] the edge in position i
+    and eo[i] its flip (0 or 1).  Edges are empty lists for a 2x2x2 cube.
+    Raises InvalidCube if a cubie doesn't exist.
+    """
+    (corners, edges) = geometry(size)
+    corner_colors = {}
+    for (c, name) in enumerate(CORNERS):
+        corner_colors[tuple(FACES.index(face) for face in name)] = c
+    edge_colors = {}
+    for (e, name) in enumerate(EDGES):
+        edge_colors[tuple(FACES.index(face) for face in name)] = e
+    (cp, co, ep, eo) = ([], [], [], [])
+    ud = (FACES.index('U'), FACES.index('D'))
+    for places in corners:
+        colors = [facelets[i] for i in places]
+        twists = [k for k in range(3) if colors[k] in ud]
+        if len(twists) != 1:
+            raise InvalidCube('A corner of the cube does not exist.')
+        twist = twists[0]
+        key = (colors[twist], colors[(twist + 1) % 3], colors[(twist + 2) % 3])
+        if key not in corner_colors:
+            raise InvalidCube('A corner of the cube does not exist.')
+        cp.append(corner_colors[key])
+        co.append(twist)
+    for places in edges:
+        colors = (facelets[places[0]], facelets[places[1]])
+        if colors in edge_colors:
+            ep.append(edge_colors[colors])
+            eo.append(0)
+        elif colors[::-1] in edge_colors:
+            ep.append(edge_colors[colors[::-1]])
+            eo.append(1)
+        else:
+            raise InvalidCube('An edge of the cube does not exist.')
+    return (cp, co, ep, eo)
+
+
+def from_cubies(size, cp, co, ep=(), eo=()):
+    """
+    Return the facelets of a solved-centers cube with the given cubies.
+    This is the inverse of to_cubies.
+    """
+    (corners, edges) = geometry(size)
+    facelets = bytearray()
+    area = size * size
+    for code in range(len(FACES)):
+        facelets.extend(bytes([code]) * area)
+    for (places, c, twist) in zip(corners, cp, co):
+        name = CORNERS[c]
+        for k in range(3):
+            facelets[places[(twist + k) % 3]] = FACES.index(name[k])
+    for (places, e, flip) in zip(edges, ep, eo):
+        name = EDGES[e]
+        for k in range(2):
+            facelets[places[(flip + k) % 2]] = FACES.index(name[k])
+    return bytes(facelets)
+
+
+# Coordinates.
+
+def parity(perm):
+    """
+    Return the parity (0 even, 1 odd) of a permutation.
+    """
+    odd = 0
+    for i in range(len(perm)):
+        for j in range(i + 1, len(perm)):
+            if perm[i] > perm[j]:
+                odd ^= 1
+    return odd
+
+
+def perm_to_index(perm):
+    """
+    Return the rank of a permutation of range(n) in lexicographic order.
+    """
+    index = 0
+    items = list(range(len(perm)))
+    for value in perm:
+        pos = items.index(value)
+        index = index * len(items) + pos
+        items.pop(pos)
+    return index
+
+
+def index_to_perm(index, n):
+    """
+    Return the permutation of range(n) with the given lexicographic rank.
+    This is the inverse of perm_to_index.
+    """
+    digits = []
+    for radix in range(1, n + 1):
+        digits.append(index % radix)
+        index //= radix
+    items = list(range(n))
+    perm = []
+    for pos in reversed(digits):
+        perm.append(items.pop(pos))
+    return perm
+
+
+def twist_to_index(co):
+    """
+    Return the orientation coordinate of a list of corner twists, using
+    all but the last twist (the last one follows from the others).
+    """
+    index = 0
+    for twist in co[:-1]:
+        index = index * 3 + twist
+    return index
+
+
+def index_to_twist(index, n):
+    """
+    Return the n corner twists of an orientation coordinate, choosing the
+    last twist so the total twist is a multiple of 3.
+    """
+    co = []
+    for _ in range(n - 1):
+        co.append(index % 3)
+        index //= 3
+    co.reverse()
+    co.append(-sum(co) % 3)
+    return co
+
+
+def flip_to_index(eo):
+    """
+    Return the orientation coordinate of a list of edge flips, using all
+    but the last flip.
+    """
+    index = 0
+    for flip in eo[:-1]:
+        index = index * 2 + flip
+    return index
+
+
+def index_to_flip(index, n):
+    """
+    Return the n edge flips of an orientation coordinate, choosing the last
+    flip so the total flip is even.
+    """
+    eo = []
+    for _ in range(n - 1):
+        eo.append(index % 2)
+        index //= 2
+    eo.reverse()
+    eo.append(sum(eo) % 2)
+    return eo
+
+
+# Random states.
+
+def random_cubies(size, rng=random):
+    """
+    Return a cubie state (cp, co, ep, eo) drawn uniformly from the states
+    that face moves can reach, by drawing each coordinate uniformly.
+
+    Arguments:
+      size (int) - 2 or 3
+      rng - the random number generator (the random module by default)
+    """
+    ncorners = len(CORNERS)
+    cp = index_to_perm(rng.randrange(math.factorial(ncorners)), ncorners)
+    co = index_to_twist(rng.randrange(3 ** (ncorners - 1)), ncorners)
+    if size == 2:
+        return (cp, co, [], [])
+    nedges = len(EDGES)
+    ep = index_to_perm(rng.randrange(math.factorial(nedges)), nedges)
+    eo = index_to_flip(rng.randrange(2 ** (nedges - 1)), nedges)
+    if parity(ep) != parity(cp):
+        # Swapping two edges matches every permutation of one parity with
+        # one of the other, so the edges stay uniform.
+        (ep[-2], ep[-1]) = (ep[-1], ep[-2])
+    return (cp, co, ep, eo)
+
+
+def random_facelets(size, rng=random):
+    """
+    Return the facelets (color codes in the layout of RubiksFlatRep) of a
+    uniformly random state of a 2x2x2 or 3x3x3 cube, in a uniformly random
+    orientation.
+    """
+    facelets = from_cubies(size, *random_cubies(size, rng))
+    (perm, _) = rng.choice(rotations(size))
+    return gather(facelets, perm)
@@ -0,0 +1,564 @@
+"""
+Thierno Diallo
+tdiallo@caltech.edu
+
+Flat permutation-table representation of Rubik's cubes.
+
+The whole cube is stored as one bytearray of facelets, face by face in
+the order U, D, F, B, L, R and row-major within a face.  Every face move
+and whole-cube rotation is a precomputed index permutation, so applying
+one is a single gather instead of a series of row and column copies.
+A turn of a single layer, such as an inner slice of a big cube, is done
+instead as slice copies of the four strips of stickers it moves.
+"""
+
+import copy      # copy.copy for copying cube states
+import math      # math.lcm for the order of a permutation
+import operator  # operator.itemgetter for the gathers
+from rubiks_rep import RubiksRep, OPPOSITE, FACE_BITS, ALL_FACES
+import rubiks_utils as rutils
+
+# Storage order of the faces and the color each face starts with.
+FACES = 'UDFBLR'
+COLORS = 'wyrogb'
+
+# Cubes at least this big turn faces with a few slice copies instead of
+# a gather of the whole cube.
+SPARSE_SIZE = 4
+
+# Translation from color letters to color codes.
+_codes = bytes.maketrans(COLORS.encode(), bytes(range(len(COLORS))))
+
+# Move tables, computed once per cube size.
+_tables = {}
+
+
+def compose(p, q):
+    """
+    Return the permutation equivalent to applying 'p' and then 'q'.
+
+    A permutation is a tuple 'perm' such that applying it to a list of
+    facelets 'old' gives 'new' with new[i] == old[perm[i]].
+    """
+    return tuple(p[i] for i in q)
+
+
+def inverse(p):
+    """
+    Return the inverse of the permutation 'p'.
+    """
+    inv = [0] * len(p)
+    for (i, j) in enumerate(p):
+        inv[j] = i
+    return tuple(inv)
+
+
+def cycle_type(p):
+    """
+    Return the cycle structure of the permutation 'p' as a dictionary
+    mapping each cycle length (other than 1) to the number of cycles of
+    that length.
+    """
+    seen = bytearray(len(p))
+    lengths = {}
+    for start in range(len(p)):
+        if seen[start]:
+            continue
+        length = 0
+        i = start
+        while not seen[i]:
+            seen[i] = 1
+            i = p[i]
+            length += 1
+        if length > 1:
+            lengths[length] = lengths.get(length, 0) + 1
+    return lengths
+
+
+def order(p):
+    """
+    Return the order of the permutation 'p': the number of times it must
+    be applied to get back where it started.
+    """
+    return math.lcm(1, *cycle_type(p))
+
+
+def identity(size):
+    """
+    Return the identity permutation for a cube of the given size.
+    """
+    return tuple(range(6 * size * size))
+
+
+def _label_rep(size):
+    """
+    Return a RubiksRep whose facelets hold their own flat index.
+    """
+    rep = RubiksRep(size)
+    index = 0
+    for face in FACES:
+        rows = []
+        for _ in range(size):
+            rows.append(list(range(index, index + size)))
+            index += size
+        rep.face_contents[face] = rows
+    return rep
+
+
+def _read_perm(rep):
+    """
+    Read the flat indices back out of a labelled RubiksRep.
+    """
+    perm = []
+    for face in FACES:
+        for row in rep.face_contents[face]:
+            perm.extend(row)
+    return tuple(perm)
+
+
+def _base_perm(size, method):
+    """
+    Return the permutation made by one call of a RubiksRep method.
+    """
+    rep = _label_rep(size)
+    getattr(rep, method)()
+    return _read_perm(rep)
+
+
+def move_tables(size):
+    """
+    Return the move table for a cube of the given size.
+
+    The table maps a move name such as 'F+' (face move) or 'X-' (whole-cube
+    rotation) to its permutation.  It is computed once per size.
+    """
+    if size in _tables:
+        return _tables[size]
+    x = _base_perm(size, 'move_stickers_x')
+    y = _base_perm(size, 'move_stickers_y')
+    z = _base_perm(size, 'move_stickers_z')
+    table = {'X+': x, 'Y+': y, 'Z+': z}
+    for axis in 'XYZ':
+        table[axis + '-'] = inverse(table[axis + '+'])
+    for face in FACES:
+        rep = _label_rep(size)
+        rep.move_face(face, '+')
+        table[face + '+'] = _read_perm(rep)
+        table[face + '-'] = inverse(table[face + '+'])
+    _tables[size] = table
+    return table
+
+
+def _getters(size):
+    """
+    Return the move table of the given size as itemgetters.
+    """
+    key = ('getters', size)
+    if key not in _tables:
+        getters = {}
+        for (name, perm) in move_tables(size).items():
+            getters[name] = operator.itemgetter(*perm)
+        _tables[key] = getters
+    return _tables[key]
+
+
+def _face_changes(size):
+    """
+    Return, for each move, which faces it changes.
+
+    A face move maps to a bitmask of the other faces whose stickers it
+    changes (bit i for face FACES[i]).  A whole-cube rotation, which
+    carries whole faces, maps to a list giving for each face the index of
+    the face it comes from.
+    """
+    key = ('changes', size)
+    if key not in _tables:
+        area = size * size
+        changes = {}
+        for (name, perm) in move_tables(size).items():
+            if name[0] in FACES:
+                mask = 0
+                for (dst, src) in enumerate(perm):
+                    if dst // area != src // area:
+                        mask |= 1 << (dst // area)
+                changes[name] = mask
+            else:
+                changes[name] = [perm[face * area] // area
+                                 for face in range(len(FACES))]
+        _tables[key] = changes
+    return _tables[key]
+
+
+def layer_perm(size, face, depth, dir):
+    """
+    Return the permutation of a quarter turn of one layer of the cube,
+    counted from the given face (depth 0 is the face itself).
+    """
+    if depth == 0:
+        return move_tables(size)[face + dir]
+    key = ('layer', size, face, depth, dir)
+    if key not in _tables:
+        rep = _label_rep(size)
+        rep.move_layer(face, depth, dir)
+        _tables[key] = _read_perm(rep)
+    return _tables[key]
+
+
+def _layers(size):
+    """
+    Return the strips of every layer as slices of the facelet array.
+
+    The result maps each face to a list, indexed by depth, of the four
+    (slice, flip) pairs of RubiksRep.edge_strips.  Rows are contiguous
+    slices and columns are slices with a step of 'size', so a layer turn
+    is a few slice copies of 'size' stickers each.
+    """
+    key = ('layers', size)
+    if key not in _tables:
+        rep = RubiksRep(size)
+        area = size * size
+        layers = {}
+        for face in FACES:
+            layers[face] = []
+            for depth in range(size):
+                strips = []
+                for (side, kind, index, flip) in rep.edge_strips(face, depth):
+                    start = FACES.index(side) * area
+                    if kind == 'row':
+                        begin = start + index * size
+                        strip = slice(begin, begin + size)
+                    else:
+                        strip = slice(start + index, start + area, size)
+                    strips.append((strip, flip))
+                layers[face].append(strips)
+        _tables[key] = layers
+    return _tables[key]
+
+
+def _face_turns(size):
+    """
+    Return itemgetters that turn the stickers of a single face clockwise
+    ('+') and counterclockwise ('-').
+    """
+    key = ('turns', size)
+    if key not in _tables:
+        turns = {}
+        for (dir, method) in [('+', 'rotate_face_cw'),
+                              ('-', 'rotate_face_ccw')]:
+            rep = _label_rep(size)
+            getattr(rep, method)(FACES[0])
+            local = []
+            for row in rep.face_contents[FACES[0]]:
+                local.extend(row)
+            turns[dir] = operator.itemgetter(*local)
+        _tables[key] = turns
+    return _tables[key]
+
+
+class RubiksFlatRep:
+    """
+    Rubik's cube representation backed by a flat facelet array.
+
+    It offers the same public interface as RubiksRep ('get_face',
+    'display', 'test_faces' and the whole-cube rotations) so RubiksCube
+    can use either one.  It also keeps track of which faces each move
+    changes, so 'is_solved' only rechecks those faces and takes constant
+    time, and sets their bits in 'changed' as RubiksRep does.
+    """
+
+    def __init__(self, size):
+        """
+        Initialize the cube representation with non-negative
+        size of cube.
+        """
+        assert size > 0
+        self.size = size
+        self.getters = _getters(size)
+        self.changes = _face_changes(size)
+        self.layers = _layers(size)
+        self.turns = _face_turns(size)
+        # Number of stickers copied by gathers, to measure moves.
+        self.touched = 0
+        # Facelets hold indices into 'colors'; a solved cube has the
+        # index of each facelet's face.
+        self.colors = list(COLORS)
+        facelets = bytearray()
+        for code in range(len(FACES)):
+            facelets.extend(bytes([code]) * (size * size))
+        self.facelets = facelets
+
+    def __deepcopy__(self, memo):
+        """
+        Copy the cube state, sharing the move tables, which never change.
+        """
+        rep = copy.copy(self)
+        rep._facelets = bytearray(self._facelets)
+        rep.colors = list(self.colors)
+        rep.single = list(self.single)
+        return rep
+
+    @property
+    def facelets(self):
+        """
+        The facelet array (a bytearray of indices into 'colors').
+        """
+        return self._facelets
+
+    @facelets.setter
+    def facelets(self, facelets):
+        """
+        Replace the facelet array and recount the colors of each face.
+        """
+        self._facelets = bytearray(facelets)
+        self.recount()
+        self.changed = ALL_FACES
+
+    def recount(self):
+        """
+        Check every face for a single color from scratch.
+
+        'single[face]' is True if that face had a single color when it was
+        last checked and 'uniform' is the number of such faces.  'dirty'
+        has bit i set if face FACES[i] changed since it was last checked.
+        """
+        self.single = [self.check_face(face) for face in range(len(FACES))]
+        self.uniform = self.single.count(True)
+        self.dirty = 0
+
+    def check_face(self, face):
+        """
+        Return True if the face with the given index has a single color.
+        """
+        area = self.size * self.size
+        start = face * area
+        facelets = self._facelets
+        return facelets.count(facelets[start], start, start + area) == area
+
+    def face_range(self, face):
+        """
+        Return the (start, end) indices of a face in the facelet array.
+        """
+        assert face in FACES
+        area = self.size * self.size
+        start = FACES.index(face) * area
+        return (start, start + area)
+
+    @property
+    def face_contents(self):
+        """
+        Return the faces as a dictionary of lists of rows, like RubiksRep.
+        """
+        contents = {}
+        for face in FACES:
+            contents[face] = self.get_face(face)
+        return contents
+
+    def get_face(self, face):
+        """
+        Return the colors of a face, as a list of lists.
+        """
+        (start, _) = self.face_range(face)
+        colors = self.colors
+        face_lst = []
+        for row in range(self.size):
+            begin = start + row * self.size
+            codes = self._facelets[begin:begin + self.size]
+            face_lst.append([colors[code] for code in codes])
+        return face_lst
+
+    def is_solved(self):
+        """
+        Return True if every face has a single color.
+        Only the faces changed since the last check are looked at.
+        """
+        if self.dirty:
+            for face in range(len(FACES)):
+                if self.dirty & (1 << face):
+                    now = self.check_face(face)
+                    if now != self.single[face]:
+                        self.single[face] = now
+                        self.uniform += 1 if now else -1
+            self.dirty = 0
+        return self.uniform == len(FACES)
+
+    # Basic operations.
+
+    def apply_perm(self, perm):
+        """
+        Apply a facelet permutation given as a tuple of indices.
+        """
+        assert len(perm) == len(self._facelets)
+        self.touched += len(perm)
+        self.facelets = operator.itemgetter(*perm)(self._facelets)
+
+    def apply_move(self, name):
+        """
+        Apply a move from the move table, e.g. 'U+' or 'X-', keeping track
+        of the faces it changes.
+        """
+        self.touched += len(self._facelets)
+        # In place, so the facelet array of a cube stays the same object.
+        self._facelets[:] = self.getters[name](self._facelets)
+        if name[0] in FACES:
+            # Only the faces around the turned face change.
+            self.dirty |= self.changes[name]
+            self.changed |= self.changes[name] | FACE_BITS[name[0]]
+        else:
+            # A rotation carries whole faces along with what is known
+            # about them.
+            sources = self.changes[name]
+            self.single = [self.single[face] for face in sources]
+            dirty = 0
+            for (face, source) in enumerate(sources):
+                if self.dirty & (1 << source):
+                    dirty |= 1 << face
+            self.dirty = dirty
+            self.changed = ALL_FACES
+
+    def move_face(self, face, dir):
+        """
+        Move the given face one quarter turn in the given direction.
+
+        Arguments:
+          - face (str): one of ['U', 'D', 'L', 'R', 'F', 'B']
+          - dir  (str): '+' for clockwise or '-' for counterclockwise
+        """
+        if self.size >= SPARSE_SIZE:
+            self.move_layer(face, 0, dir)
+        else:
+            self.apply_move(face + dir)
+
+    def move_layer(self, face, depth, dir):
+        """
+        Move one layer of the cube a quarter turn, as seen from the given
+        face.  Only the stickers in the layer are touched, so an inner
+        slice costs a few slice copies of 'size' stickers.
+
+        Arguments:
+          face (str) - one of ['U', 'D', 'L', 'R', 'F', 'B']
+          depth (int) - layer counted from that face, between [0, size);
+                        0 is the face itself
+          dir (str) - '+' for clockwise or '-' for counterclockwise
+        """
+        assert face in FACES
+        assert dir in ['+', '-']
+        assert 0 <= depth < self.size
+        strips = self.layers[face][depth]
+        facelets = self._facelets
+        values = [facelets[strip] for (strip, _) in strips]
+        for num in range(4):
+            if dir == '+':
+                # Strip num receives the next strip's stickers.
+                (strip, flip) = strips[num]
+                val = values[(num + 1) % 4]
+            else:
+                # The next strip receives strip num's stickers.
+                (strip, _) = strips[(num + 1) % 4]
+                val = values[num]
+                flip = strips[num][1]
+            facelets[strip] = val[::-1] if flip else val
+        self.touched += 4 * self.size
+        if depth == 0:
+            self.turn_face(face, dir)
+        if depth == self.size - 1:
+            self.turn_face(OPPOSITE[face], '-' if dir == '+' else '+')
+        # Turning a layer changes the same faces as turning its face.
+        self.dirty |= self.changes[face + '+']
+        self.changed |= self.changes[face + '+']
+
+    def turn_face(self, face, dir):
+        """
+        Turn the stickers of one face a quarter turn, leaving the rest of
+        the cube alone.
+        """
+        if self.size == 1:
+            return
+        (start, end) = self.face_range(face)
+        self.touched += end - start
+        self.changed |= FACE_BITS[face]
+        self._facelets[start:end] = \
+            bytes(self.turns[dir](self._facelets[start:end]))
+
+    def rotate_cube(self, axis, dir):
+        """
+        Rotate the cube as a whole around the given axis.
+
+        Arguments:
+          axis (str) - one of ['X', 'Y', 'Z']
+          dir  (str) - one of ['+', '-']
+        """
+        self.apply_move(axis + dir)
+
+    def move_front(self):
+        """
+        Move the F (front) face one-quarter turn clockwise.
+        """
+        self.apply_move('F+')
+
+    def rotate_cube_x(self):
+        """
+        Rotate the cube in the positive X direction.
+        """
+        self.apply_move('X+')
+
+    def rotate_cube_y(self):
+        """
+        Rotate the cube in the positive Y direction.
+        """
+        self.apply_move('Y+')
+
+    def rotate_cube_z(self):
+        """
+        Rotate the cube in the positive Z direction.
+        """
+        self.apply_move('Z+')
+
+    def display(self):
+        """
+        Return a string version of the cube representation.
+        """
+
+        return rutils.display(self.face_contents, self.size)
+
+    def test_faces(self):
+        """
+        Load the representation with unique characters. For testing.
+        Raises ValueError if there are more labels than a byte can
+        number (a big cube), which only RubiksRep can hold.
+        """
+
+        contents = rutils.test_faces(self.size)
+        colors = []
+        codes = {}
+        facelets = bytearray()
+        for face in FACES:
+            for row in contents[face]:
+                for label in row:
+                    if label not in codes:
+                        if len(colors) == 0x100:
+                            raise ValueError(
+                                'A flat cube holds at most 256 labels; use '
+                                'the list engine for test faces of a cube '
+                                f'of size {self.size}.')
+                        codes[label] = len(colors)
+                        colors.append(label)
+                    facelets.append(codes[label])
+        self.colors = colors
+        self.facelets = facelets
+
+    def load_colors(self, colors):
+        """
+        Replace all the stickers, given one color letter per sticker in
+        the layout of the facelet array (a str).
+        """
+        assert len(colors) == len(self._facelets)
+        self.colors = list(COLORS)
+        self.facelets = colors.encode().translate(_codes)
+
+
+if __name__ == '__main__':
+    rep = RubiksFlatRep(3)
+    rep.test_faces()
+    print(rep.display())
+    rep.rotate_cube_z()
+    print(rep.display())
@@ -0,0 +1,129 @@
+"""
+Thierno Diallo
+tdiallo@caltech.edu
+
+Canonical state keys for Rubik's cubes.
+
+The key of a cube is an int that is the same for every whole-cube
+rotation of the cube and, optionally, for its mirror image.  It is found
+by trying all 24 rotations (48 symmetries with mirrors) of the facelets
+and keeping the smallest, packed in base 6.
+"""
+
+import operator  # operator.itemgetter for the gathers
+import rubiks_cubies as cubies
+from rubiks_flat import FACES, COLORS, RubiksFlatRep
+
+# Symmetry gathers, computed once per size and mirror flag.
+_symmetries = {}
+
+
+def rep_facelets(rep):
+    """
+    Return the facelets of a RubiksRep or RubiksFlatRep as bytes of color
+    codes (0 for 'w', 1 for 'y', ...).
+    """
+    if isinstance(rep, RubiksFlatRep) and rep.colors == list(COLORS):
+        return bytes(rep.facelets)
+    codes = []
+    for face in FACES:
+        for row in rep.get_face(face):
+            for color in row:
+                codes.append(COLORS.index(color))
+    return bytes(codes)
+
+
+def mirror_perm(size):
+    """
+    Return the facelet permutation that reflects a 2x2x2 or 3x3x3 cube
+    left to right, swapping the L and R faces.
+    """
+    sigs = cubies.signatures(size)
+    swap = {'L': 'R', 'R': 'L'}
+    area = size * size
+    where = {}
+    for (i, sig) in enumerate(sigs):
+        where[(FACES[i // area], sig)] = i
+    perm = []
+    for (i, sig) in enumerate(sigs):
+        face = FACES[i // area]
+        mirrored = frozenset(swap.get(f, f) for f in sig)
+        perm.append(where[(swap.get(face, face), mirrored)])
+    return tuple(perm)
+
+
+def _gathers(size, mirror):
+    """
+    Return (getter, recolor) pairs for all symmetries: each getter moves
+    the facelets and recolor (a bytes.translate table or None) fixes the
+    colors of mirror images.
+    """
+    key = (size, mirror)
+    if key not in _symmetries:
+        gathers = []
+        for (perm, _) in cubies.rotations(size):
+            gathers.append((operator.itemgetter(*perm), None))
+        if mirror:
+            # The mirror image of a cube has green and blue swapped.
+            recolor = bytes.maketrans(
+                bytes([COLORS.index('g'), COLORS.index('b')]),
+                bytes([COLORS.index('b'), COLORS.index('g')]))
+            flip = mirror_perm(size)
+            for (perm, _) in cubies.rotations(size):
+                both = tuple(flip[i] for i in perm)
+                gathers.append((operator.itemgetter(*both), recolor))
+        _symmetries[key] = gathers
+    return _symmetries[key]
+
+
+def state_key(rep, mirror=False):
+    """
+    Return the canonical key of a cube representation.
+
+    Arguments:
+      rep - a RubiksRep or RubiksFlatRep
+      mirror (bool) - True to also give mirror images the same key
+                      (2x2x2 and 3x3x3 cubes only)
+
+    Return value: an int; decode_key turns it back into a cube
+    """
+    if mirror:
+        assert rep.size in [2, 3]
+    facelets = rep_facelets(rep)
+    best = None
+    for (getter, recolor) in _gathers(rep.size, mirror):
+        candidate = bytes(getter(facelets))
+        if recolor is not None:
+            candidate = candidate.translate(recolor)
+        if best is None or candidate < best:
+            best = candidate
+    key = 0
+    for code in best:
+        key = key * 6 + code
+    return key
+
+
+def decode_key(key, size):
+    """
+    Return the canonical cube of a key as a RubiksFlatRep.
+
+    Arguments:
+      key (int) - a key from state_key
+      size (int) - dimension of the cube
+    """
+    codes = bytearray(6 * size * size)
+    for i in range(len(codes) - 1, -1, -1):
+        (key, codes[i]) = divmod(key, 6)
+    assert key == 0
+    rep = RubiksFlatRep(size)
+    rep.facelets = codes
+    return rep
+
+
+if __name__ == '__main__':
+    from rubiks_cube import RubiksCube
+    cube = RubiksCube(3)
+    cube.scramble()
+    print(state_key(cube.rep))
+    cube.rotate_cube('X', '+')
+    print(state_key(cube.rep))
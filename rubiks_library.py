@@ -0,0 +1,324 @@
+"""
+Thierno Diallo
+tdiallo@caltech.edu
+
+Binary libraries of precompiled user commands.
+
+A library holds, for every user command, its source (the commands it
+expands to), the user commands it uses directly or indirectly, and its
+compiled facelet permutation and quarter-turn count for each cube size
+the library was built for.  The file is opened through a memory map and
+nothing is read until a command is looked up by name, so opening a
+library of tens of thousands of commands takes no time, and using a
+command needs neither parsing nor compiling.
+
+The file, all little-endian, is laid out as
+
+    header   magic 'RLIB', version (H), flags (B), number of sizes (B),
+             number of commands (I), offset of the index (I), then one
+             byte per size
+    records  one per command: source length (I) and source, number of
+             dependencies (H) and each one's length (H) and name, then
+             for each size the quarter turns (I, NOT_COMPILED if the
+             command couldn't be compiled) and, if compiled, the
+             permutation, 6*N*N unsigned integers of 1, 2 or 4 bytes
+             each depending on the size
+    names    the command names, one after the other
+    index    one entry per command, sorted by name: offset of the record
+             (I), offset of the name (I) and length of the name (H)
+
+The only flag, SIMPLIFIED, says whether the commands were simplified
+before compiling, which changes their quarter-turn counts.
+"""
+
+import array   # array.array for permutations
+import mmap    # mmap.mmap for lazy loading
+import os      # os.replace for replacing libraries in one step
+import struct  # struct for the header, records and index
+import sys     # sys.byteorder
+from collections.abc import Mapping
+
+MAGIC = b'RLIB'
+VERSION = 1
+SIMPLIFIED = 1
+NOT_COMPILED = 0xFFFFFFFF
+
+HEADER = struct.Struct('<4sHBBII')
+ENTRY = struct.Struct('<IIH')
+LENGTH = struct.Struct('<I')
+SHORT = struct.Struct('<H')
+
+
+def perm_typecode(size):
+    """
+    Return the array typecode of the permutations of a cube size.
+    """
+    facelets = 6 * size * size
+    if facelets <= 0x100:
+        return 'B'
+    if facelets <= 0x10000:
+        return 'H'
+    return 'I'
+
+
+def is_library(filename):
+    """
+    Return True if a file is a binary command library.
+    """
+    with open(filename, 'rb') as infile:
+        return infile.read(len(MAGIC)) == MAGIC
+
+
+def write_library(filename, sources, compiled, simplified=True):
+    """
+    Write a binary command library.
+
+    Arguments:
+      filename (str) - the output file
+      sources (dict) - maps each command name to its source string
+      compiled (dict) - maps each cube size to a dictionary mapping
+                        command names to (perm, count, deps) tuples, where
+                        deps is the set of user commands used directly or
+                        indirectly; commands missing from it are stored
+                        as not compiled for that size
+      simplified (bool) - True if the commands were simplified before
+                          compiling
+    """
+    sizes = sorted(compiled)
+    assert len(sizes) < 0x100
+    names = sorted(sources, key=lambda name: name.encode())
+    # Write to a new file and then put it in place, since the file being
+    # replaced may be memory mapped by an open Library, which would read
+    # garbage (or crash) if the file were rewritten under it.
+    temp = f'{filename}.{os.getpid()}.tmp'
+    try:
+        _write(temp, sizes, names, sources, compiled, simplified)
+        os.replace(temp, filename)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+
+def _write(filename, sizes, names, sources, compiled, simplified):
+    """
+    Write a binary command library; see write_library.
+    """
+    with open(filename, 'wb') as outfile:
+        outfile.write(HEADER.pack(MAGIC, VERSION,
+                                  SIMPLIFIED if simplified else 0,
+                                  len(sizes), len(names), 0))
+        outfile.write(bytes(sizes))
+        records = []
+        for name in names:
+            records.append(outfile.tell())
+            source = sources[name].encode()
+            outfile.write(LENGTH.pack(len(source)))
+            outfile.write(source)
+            deps = set()
+            for size in sizes:
+                if name in compiled[size]:
+                    deps |= compiled[size][name][2]
+            outfile.write(SHORT.pack(len(deps)))
+            for dep in sorted(deps):
+                dep = dep.encode()
+                outfile.write(SHORT.pack(len(dep)))
+                outfile.write(dep)
+            for size in sizes:
+                if name not in compiled[size]:
+                    outfile.write(LENGTH.pack(NOT_COMPILED))
+                    continue
+                (perm, count, _) = compiled[size][name]
+                perm = array.array(perm_typecode(size), perm)
+                if sys.byteorder == 'big':
+                    perm.byteswap()
+                outfile.write(LENGTH.pack(count))
+                outfile.write(perm.tobytes())
+        offsets = []
+        for name in names:
+            offsets.append(outfile.tell())
+            outfile.write(name.encode())
+        index = outfile.tell()
+        for (name, record, offset) in zip(names, records, offsets):
+            outfile.write(ENTRY.pack(record, offset, len(name.encode())))
+        outfile.seek(0)
+        outfile.write(HEADER.pack(MAGIC, VERSION,
+                                  SIMPLIFIED if simplified else 0,
+                                  len(sizes), len(names), index))
+
+
+class Library(Mapping):
+    """
+    A binary command library, opened lazily.  As a mapping it maps
+    command names to their sources, like RubiksControl.user_commands.
+    """
+
+    def __init__(self, filename):
+        """
+        Open a library file.
+
+        Argument:
+            filename (str) - the library file
+        """
+        with open(filename, 'rb') as infile:
+            self.data = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+            # The file mapped, which stays the same even if another file
+            # is later put in its place.
+            info = os.fstat(infile.fileno())
+            self.file_id = (info.st_dev, info.st_ino)
+        (magic, version, flags, nsizes, self.count, self.index) = \
+            HEADER.unpack_from(self.data, 0)
+        assert magic == MAGIC
+        assert version == VERSION
+        self.simplified = bool(flags & SIMPLIFIED)
+        self.sizes = list(self.data[HEADER.size:HEADER.size + nsizes])
+        # Compiled forms read so far, by (name, size).  A library never
+        # changes, so everyone using it can share them.
+        self.cache = {}
+        # Number of users of the library: whoever opened it, and those it
+        # was shared with.  The memory map is closed when the last one
+        # closes it.
+        self.users = 1
+
+    def is_file(self, filename):
+        """
+        Return True if a file name names the very file this library maps.
+        """
+        try:
+            info = os.stat(filename)
+        except OSError:
+            return False
+        return (info.st_dev, info.st_ino) == self.file_id
+
+    def share(self):
+        """
+        Count one more user of the library, who must close it when done
+        with it, and return the library.
+        """
+        assert self.users > 0
+        self.users += 1
+        return self
+
+    def close(self):
+        """
+        Stop using the library, closing the memory map if no one else is
+        using it.
+        """
+        assert self.users > 0
+        self.users -= 1
+        if self.users == 0:
+            self.data.close()
+
+    def entry(self, position):
+        """
+        Return the (record offset, name) of an index entry.
+        """
+        (record, offset, length) = \
+            ENTRY.unpack_from(self.data, self.index + position * ENTRY.size)
+        return (record, self.data[offset:offset + length])
+
+    def find(self, name):
+        """
+        Return the offset of the record of a command, found by binary
+        search of the index, or None if the library doesn't have it.
+        """
+        if type(name) is not str:
+            return None
+        key = name.encode()
+        (low, high) = (0, self.count)
+        while low < high:
+            middle = (low + high) // 2
+            (record, found) = self.entry(middle)
+            if found == key:
+                return record
+            if found < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def read_string(self, offset, length_struct):
+        """
+        Return a string stored after its length, and the offset after it.
+        """
+        (length,) = length_struct.unpack_from(self.data, offset)
+        offset += length_struct.size
+        return (self.data[offset:offset + length].decode(), offset + length)
+
+    def __getitem__(self, name):
+        record = self.find(name)
+        if record is None:
+            raise KeyError(name)
+        return self.read_string(record, LENGTH)[0]
+
+    def __contains__(self, name):
+        return self.find(name) is not None
+
+    def __iter__(self):
+        for position in range(self.count):
+            yield self.entry(position)[1].decode()
+
+    def __len__(self):
+        return self.count
+
+    def compiled(self, name, size):
+        """
+        Return the compiled form of a command for a cube size.
+
+        Return value: a tuple (perm, count, deps) of the permutation, its
+        quarter turns and the set of user commands the command uses, or
+        None if the library has no compiled form of it for this size
+        """
+        key = (name, size)
+        if key not in self.cache:
+            self.cache[key] = self.read_compiled(name, size)
+        return self.cache[key]
+
+    def read_compiled(self, name, size):
+        """
+        Read the compiled form of a command; see compiled().
+        """
+        record = self.find(name)
+        if record is None or size not in self.sizes:
+            return None
+        (_, offset) = self.read_string(record, LENGTH)
+        (ndeps,) = SHORT.unpack_from(self.data, offset)
+        offset += SHORT.size
+        deps = set()
+        for _ in range(ndeps):
+            (dep, offset) = self.read_string(offset, SHORT)
+            deps.add(dep)
+        for stored in self.sizes:
+            (count,) = LENGTH.unpack_from(self.data, offset)
+            offset += LENGTH.size
+            if count == NOT_COMPILED:
+                if stored == size:
+                    return None
+                continue
+            perm = array.array(perm_typecode(stored))
+            end = offset + 6 * stored * stored * perm.itemsize
+            if stored == size:
+                perm.frombytes(self.data[offset:end])
+                if sys.byteorder == 'big':
+                    perm.byteswap()
+                return (tuple(perm), count, deps)
+            offset = end
+        return None
+
+
+if __name__ == '__main__':
+    import argparse
+    from rubiks_control import RubiksControl
+    parser = argparse.ArgumentParser(
+        description='Compile a text file of user commands into a library.')
+    parser.add_argument('source', help="text file of 'name contents' lines")
+    parser.add_argument('library', help='library file to write')
+    parser.add_argument('--sizes', default='2,3')
+    parser.add_argument('--no-simplify', action='store_true')
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+    control = RubiksControl(sizes[0], scramble=False,
+                            simplify=not args.no_simplify)
+    control.exec_load_commands(args.source)
+    control.save_library(args.library, sizes)
+    print(f'{len(control.user_commands)} commands, sizes {sizes}')
@@ -0,0 +1,173 @@
+"""
+Thierno Diallo
+tdiallo@caltech.edu
+
+Cached text rendering of Rubik's cubes.
+
+A Renderer keeps the text of every row of every face from the last time
+it drew the cube, along with a copy of the row's stickers.  The cube's
+representation marks the faces each move changes (its 'changed' mask,
+which the renderer clears), so when it draws the same cube again only
+the faces marked are read, only the rows of stickers of those faces that
+changed are redrawn, and only the lines of the output those rows appear
+on are rebuilt.  A face move redraws a few rows of five faces and never
+looks at the sixth, and a long session of small changes costs little.
+A representation's mask is for one renderer: the renderer that clears it
+is the only one to see the changes.
+
+Two styles are available: 'net', the unfolded cube
+
+          U
+      L F R B
+          D
+
+with one line per row of stickers, and 'compact', a single line holding
+the six faces in the order U D F B L R, each written row by row as
+stored, e.g.
+"U:wwwwwwwww D:yyyyyyyyy F:...".  (This is not the layout of
+rubiks_utils.display, which RubiksControl still uses by default.)
+"""
+
+from rubiks_rep import FACE_BITS, ALL_FACES
+
+FACES = 'UDFBLR'
+STYLES = ['net', 'compact']
+
+
+def row_keys(rep, face):
+    """
+    Return, for each row of a face of a RubiksRep or RubiksFlatRep, a copy
+    of its stickers that can be compared to later copies.
+    """
+    size = rep.size
+    if hasattr(rep, 'face_range'):
+        (start, end) = rep.face_range(face)
+        stickers = bytes(rep.facelets[start:end])
+        return [stickers[row * size:(row + 1) * size] for row in range(size)]
+    return [tuple(row) for row in rep.get_face(face)]
+
+
+class Renderer:
+    """
+    Draws cubes as text, redrawing only what changed since last time.
+    """
+
+    def __init__(self, style='net'):
+        """
+        Start with nothing drawn.
+
+        Argument:
+            style (str) - 'net' or 'compact'
+        """
+        assert style in STYLES
+        self.style = style
+        # For each face, the row keys and the text of each row from the
+        # last drawing.
+        self.faces = {}
+        # Lines of the last drawing, and the representation, size and
+        # colors it was for.
+        self.lines = []
+        self.rep = None
+        self.size = None
+        self.colors = None
+        # Translation from color codes to single-character colors.
+        self.table = None
+        # Number of rows redrawn, to measure the cache.
+        self.redrawn = 0
+
+    def row_text(self, rep, face, key):
+        """
+        Return the text of one row of a face, given its row key.
+        """
+        if type(key) is bytes:
+            colors = rep.colors
+            if self.table is not None:
+                text = key.translate(self.table).decode('ascii')
+            else:
+                text = [colors[code] for code in key]
+        else:
+            text = key
+        if self.style == 'compact':
+            return ''.join(text)
+        if face == 'B':
+            # The B face is stored as seen through the cube, upside down
+            # from how it appears in the net.
+            text = text[::-1]
+        return ' '.join(text)
+
+    def face_rows(self, rep, face):
+        """
+        Return the text of each row of a face, redrawing only the rows
+        whose stickers changed, and the set of rows that were redrawn.
+        """
+        keys = row_keys(rep, face)
+        (old_keys, texts) = self.faces.get(face, ([None] * rep.size,
+                                                  [''] * rep.size))
+        texts = list(texts)
+        changed = set()
+        for (row, key) in enumerate(keys):
+            if key != old_keys[row]:
+                texts[row] = self.row_text(rep, face, key)
+                changed.add(row)
+        self.redrawn += len(changed)
+        self.faces[face] = (keys, texts)
+        return (texts, changed)
+
+    def render(self, rep):
+        """
+        Return the text of a cube representation in this renderer's style.
+        """
+        colors = getattr(rep, 'colors', None)
+        if rep is not self.rep or rep.size != self.size or \
+                colors != self.colors:
+            # The changes marked are only since this renderer last drew
+            # this representation.
+            self.faces = {}
+            self.lines = []
+            self.rep = rep
+            self.size = rep.size
+            self.colors = None if colors is None else list(colors)
+            self.table = None
+            if colors is not None and \
+                    all(len(color) == 1 and color.isascii() for color in colors):
+                self.table = bytes.maketrans(bytes(range(len(colors))),
+                                             ''.join(colors).encode('ascii'))
+        rows = {}
+        changed = {}
+        marked = getattr(rep, 'changed', ALL_FACES)
+        for face in FACES:
+            if face in self.faces and not marked & FACE_BITS[face]:
+                (rows[face], changed[face]) = (self.faces[face][1], set())
+            else:
+                (rows[face], changed[face]) = self.face_rows(rep, face)
+        rep.changed = 0
+        if self.style == 'compact':
+            return ' '.join(f'{face}:{"".join(rows[face])}'
+                            for face in FACES)
+        size = rep.size
+        if self.lines == []:
+            self.lines = [''] * (3 * size)
+            for face in FACES:
+                changed[face] = set(range(size))
+        # The B face is drawn upside down, so its rows are in reverse.
+        changed['B'] = {size - 1 - row for row in changed['B']}
+        rows['B'] = rows['B'][::-1]
+        pad = ' ' * (2 * size + 1)
+        for row in changed['U']:
+            self.lines[row] = pad + rows['U'][row]
+        for row in changed['L'] | changed['F'] | changed['R'] | changed['B']:
+            self.lines[size + row] = '  '.join(rows[face][row]
+                                               for face in 'LFRB')
+        for row in changed['D']:
+            self.lines[2 * size + row] = pad + rows['D'][row]
+        return '\n'.join(self.lines) + '\n'
+
+
+if __name__ == '__main__':
+    from rubiks_cube import RubiksCube
+    cube = RubiksCube(3)
+    renderer = Renderer()
+    print(renderer.render(cube.rep))
+    cube.move_face('U', '+')
+    print(renderer.render(cube.rep))
+    print(Renderer('compact').render(cube.rep))
@@ -8,10 +8,37 @@ import copy
 from typing import Sized  # copy for copy.deepcopy
 import rubiks_utils as rutils
 
+# The face opposite each face.
+OPPOSITE = {'U': 'D', 'D': 'U', 'F': 'B', 'B': 'F', 'L': 'R', 'R': 'L'}
+FACE_ORDER = 'UDFBLR'
+# Bit of each face in the 'changed' masks of the representations, and
+# the mask of all of them.
+FACE_BITS = {face: 1 << num for (num, face) in enumerate(FACE_ORDER)}
+ALL_FACES = (1 << len(FACE_ORDER)) - 1
+
+# Orientation frames and how rotations move between them, found once.
+_frames = {}
+
 
 class RubiksRep:
     """
     Basic functionality of Rubik's cubes.
+
+    Whole-cube rotations don't move any stickers: they only change 'frame',
+    the index of one of the 24 orientations, which says which stored face
+    is seen as each face and how far it is turned.  Face moves are sent to
+    the stored face under the requested one, and the stored faces are
+    rearranged to match the frame ("materialized") only when the faces are
+    read, through 'face_contents', 'get_face' or 'display'.
+
+    The row, column and face rotation primitives (get_row, set_col,
+    rotate_face_cw...) materialize the faces first, so they work on the
+    faces as seen; the moves use private versions of them (_get_row,
+    _set_col, _turn_cw...) that work on the stored faces instead.
+
+    'changed' has the bit (FACE_BITS) of every face, as seen, whose
+    stickers may have changed since it was last cleared; rubiks_render
+    clears it when it draws the cube.
     """
 
     def __init__(self, size):
@@ -25,14 +52,87 @@ class RubiksRep:
             ('B', 'o'), ('L', 'g'), ('R', 'b')
         ]
         self.size = size
-        self.face_contents = {}
+        # Number of stickers copied by get/set row/col, to measure moves.
+        self.touched = 0
+        # Orientation of the cube; 0 means the stored faces are as seen.
+        self.frame = 0
+        self.changed = ALL_FACES
+        self._faces = {}
         for pair in face_colors:
             rows = list(pair[1] * size)
             cell = []
             for num in range(0, size):
                 # we append a copy to avoid aliasing or otherwise won't pass.
                 cell.append(rows[:])
-            self.face_contents[pair[0]] = cell[:]
+            self._faces[pair[0]] = cell[:]
+        self.recount()
+
+    @property
+    def face_contents(self):
+        """
+        The faces as seen, as a dictionary of lists of rows.
+        """
+        self.materialize()
+        return self._faces
+
+    @face_contents.setter
+    def face_contents(self, faces):
+        """
+        Replace all the faces, as seen.
+        """
+        self._faces = faces
+        self.frame = 0
+        self.changed = ALL_FACES
+        self.recount()
+
+    def recount(self):
+        """
+        Check every stored face for a single color from scratch.
+
+        'single[face]' is True if that stored face had a single color when
+        it was last checked and 'uniform' is the number of such faces.
+        'dirty' has the bit (FACE_BITS) of each stored face that changed
+        since it was last checked, as in RubiksFlatRep.
+        """
+        self.single = {face: self.check_face(face) for face in FACE_ORDER}
+        self.uniform = list(self.single.values()).count(True)
+        self.dirty = 0
+
+    def check_face(self, face):
+        """
+        Return True if a stored face has a single color.
+        """
+        grid = self._faces[face]
+        color = grid[0][0]
+        for row in grid:
+            for elem in row:
+                if elem != color:
+                    return False
+        return True
+
+    def materialize(self):
+        """
+        Rearrange the stored faces to match the orientation frame, so they
+        are the faces as seen.
+        """
+        if self.frame == 0:
+            return
+        (frames, _) = orientations()
+        faces = {}
+        single = {}
+        dirty = 0
+        for (face, (stored, turns)) in zip(FACE_ORDER, frames[self.frame]):
+            faces[face] = turn_grid(self._faces[stored], turns)
+            if turns:
+                self.touched += self.size * self.size
+            # Turning a face doesn't change whether it has a single color.
+            single[face] = self.single[stored]
+            if self.dirty & FACE_BITS[stored]:
+                dirty |= FACE_BITS[face]
+        self._faces = faces
+        self.single = single
+        self.dirty = dirty
+        self.frame = 0
 
     def get_row(self, face, row):
         """
@@ -46,12 +146,8 @@ class RubiksRep:
         Return:
             (list)
         """
-        assert face in self.face_contents
-        assert row >= 0 and row < self.size
-        fin_lst = []
-        for num in range(0, self.size):
-            fin_lst.append(self.face_contents[face][row][num])
-        return fin_lst
+        self.materialize()
+        return self._get_row(face, row)
 
     def get_col(self, face, col):
         """
@@ -65,48 +161,52 @@ class RubiksRep:
         Return:
             (list) - list of strings
         """
-        assert face in self.face_contents
-        assert col >= 0 and col < self.size
-        fin_lst = []
-        for num in range(0, self.size):
-            fin_lst.append(self.face_contents[face][num][col])
-        return fin_lst
+        self.materialize()
+        return self._get_col(face, col)
 
     def set_row(self, face, row, values):
         """
         Change the contents of the indicated row on the indicated face.
         The internal representation of the cube is not altered.
         """
-        assert face in self.face_contents
-        assert row >= 0 and row < self.size
-        assert type(values) is list
-        assert len(values) == self.size
-        val = values[:]
-        self.face_contents[face][row] = val
+        self.materialize()
+        self._set_row(face, row, values)
 
     def set_col(self, face, col, values):
         """
         Change the contents of the indicated column on the indicated face.
         The internal representation of the cube is not altered.
         """
-        assert face in self.face_contents
-        assert col >= 0 and col < self.size
-        assert type(values) is list
-        assert len(values) == self.size
-        val = values[:]
-        for num in range(0, len(values)):
-            self.face_contents[face][num][col] = val[num]
+        self.materialize()
+        self._set_col(face, col, values)
 
     def get_face(self, face):
         """
         Return the colors of a face, as a list of lists.
         """
-        assert face in self.face_contents
+        self.materialize()
+        assert face in self._faces
         face_lst = []
         for num in range(0, self.size):
-            face_lst.append(self.face_contents[face][num])
+            face_lst.append(self._faces[face][num])
         return face_lst
 
+    def is_solved(self):
+        """
+        Return True if every face has a single color.
+        This doesn't depend on the orientation, so it reads the stored faces,
+        and only those changed since the last check.
+        """
+        if self.dirty:
+            for face in FACE_ORDER:
+                if self.dirty & FACE_BITS[face]:
+                    now = self.check_face(face)
+                    if now != self.single[face]:
+                        self.single[face] = now
+                        self.uniform += 1 if now else -1
+            self.dirty = 0
+        return self.uniform == len(FACE_ORDER)
+
     # Basic operations.
 
     def rotate_face_cw(self, face):
@@ -116,91 +216,341 @@ class RubiksRep:
         Argument:
             face (str) - single-character face string.
         """
+        self.materialize()
+        self._turn_cw(face)
+
+    def rotate_face_ccw(self, face):
+        """
+        Rotate a given face counterclockwise.
+
+        Argument:
+            face (str) - single-character face string.
+        """
+        self.materialize()
+        self._turn_ccw(face)
+
+    # The same operations on the stored faces, whatever the frame, for
+    # the moves.
+
+    def _get_row(self, face, row):
+        """
+        Return a copy of a row of a stored face; see get_row.
+        """
+        assert face in self._faces
+        assert row >= 0 and row < self.size
+        self.touched += self.size
+        fin_lst = []
+        for num in range(0, self.size):
+            fin_lst.append(self._faces[face][row][num])
+        return fin_lst
+
+    def _get_col(self, face, col):
+        """
+        Return a copy of a column of a stored face; see get_col.
+        """
+        assert face in self._faces
+        assert col >= 0 and col < self.size
+        self.touched += self.size
+        fin_lst = []
+        for num in range(0, self.size):
+            fin_lst.append(self._faces[face][num][col])
+        return fin_lst
+
+    def _set_row(self, face, row, values):
+        """
+        Change a row of a stored face; see set_row.
+        """
+        assert face in self._faces
+        assert row >= 0 and row < self.size
+        assert type(values) is list
+        assert len(values) == self.size
+        self.touched += self.size
+        self.dirty |= FACE_BITS[face]
+        # A stored face is the face seen only in the first frame.
+        if self.frame == 0:
+            self.changed |= FACE_BITS[face]
+        else:
+            self.changed = ALL_FACES
+        val = values[:]
+        self._faces[face][row] = val
+
+    def _set_col(self, face, col, values):
+        """
+        Change a column of a stored face; see set_col.
+        """
+        assert face in self._faces
+        assert col >= 0 and col < self.size
+        assert type(values) is list
+        assert len(values) == self.size
+        self.touched += self.size
+        self.dirty |= FACE_BITS[face]
+        if self.frame == 0:
+            self.changed |= FACE_BITS[face]
+        else:
+            self.changed = ALL_FACES
+        val = values[:]
+        for num in range(0, len(values)):
+            self._faces[face][num][col] = val[num]
+
+    def _turn_cw(self, face):
+        """
+        Rotate a stored face clockwise; see rotate_face_cw.
+        """
         # There is a shorter way to write this function using get_face(), but
         # the intructions required that we use get_row or get_col
-        assert face in self.face_contents
+        assert face in self._faces
         rows = []
         for num in range(0, self.size):
-            rows.append(self.get_row(face, num))
+            rows.append(self._get_row(face, num))
         for num2 in range(0, self.size):
-            self.set_col(face, num2, rows[(self.size - (num2 + 1))])
+            self._set_col(face, num2, rows[(self.size - (num2 + 1))])
 
-    def rotate_face_ccw(self, face):
+    def _turn_ccw(self, face):
         """
-        Rotate a given face counterclockwise.
+        Rotate a stored face counterclockwise; see rotate_face_ccw.
+        """
+        assert face in self._faces
+        rows = []
+        for num in range(0, self.size):
+            rows.append(self._get_row(face, num))
+        for num2 in range(0, self.size):
+            rows[num2].reverse()
+            self._set_col(face, num2, rows[num2])
 
-        Argument:
+    def edge_strips(self, face, depth=0):
+        """
+        Return the four strips of stickers that turn along with a layer.
+
+        Each strip is a tuple (face, kind, index, flip) where kind is 'row'
+        or 'col'.  A clockwise turn moves the contents of each strip into
+        the strip before it, reversed if that earlier strip's flip is True.
+
+        Arguments:
             face (str) - single-character face string.
+            depth (int) - layer counted from that face, between [0, size);
+                          0 is the face itself
+
+        Return:
+            (list) - list of four tuples
+        """
+        assert 0 <= depth < self.size
+        last = self.size - 1
+        strips = {
+            'U': [('F', 'row', 0, False), ('R', 'row', 0, True),
+                  ('B', 'row', last, True), ('L', 'row', 0, False)],
+            'D': [('F', 'row', last, False), ('L', 'row', last, True),
+                  ('B', 'row', 0, True), ('R', 'row', last, False)],
+            'F': [('U', 'row', last, True), ('L', 'col', last, False),
+                  ('D', 'row', 0, True), ('R', 'col', 0, False)],
+            'B': [('U', 'row', 0, False), ('R', 'col', last, True),
+                  ('D', 'row', last, False), ('L', 'col', 0, True)],
+            'L': [('U', 'col', 0, False), ('B', 'col', 0, False),
+                  ('D', 'col', 0, False), ('F', 'col', 0, False)],
+            'R': [('U', 'col', last, False), ('F', 'col', last, False),
+                  ('D', 'col', last, False), ('B', 'col', last, False)],
+        }
+        # Deeper layers lie further in from the edge each strip is on.
+        layer = []
+        for (side, kind, index, flip) in strips[face]:
+            index = index + depth if index == 0 else index - depth
+            layer.append((side, kind, index, flip))
+        return layer
+
+    def move_face(self, face, dir):
+        """
+        Move a face one quarter turn, touching only the stickers on that
+        face and the four strips around it.
+
+        Arguments:
+            face (str) - single-character face string.
+            dir (str) - '+' for clockwise or '-' for counterclockwise
+        """
+        self.move_layer(face, 0, dir)
+
+    def stored_face(self, face):
         """
-        assert face in self.face_contents
-        for num in range(0, 3):
-            self.rotate_face_cw(face)
+        Return the stored face that is seen as the given face.
+        Turning the one turns the other, whatever the orientation.
+        """
+        if self.frame == 0:
+            return face
+        (frames, _) = orientations()
+        return frames[self.frame][FACE_ORDER.index(face)][0]
+
+    def move_layer(self, face, depth, dir):
+        """
+        Move one layer of the cube a quarter turn, as seen from the given
+        face.  An inner layer touches only its four strips of stickers.
+
+        Arguments:
+            face (str) - single-character face string.
+            depth (int) - layer counted from that face, between [0, size);
+                          0 is the face itself
+            dir (str) - '+' for clockwise or '-' for counterclockwise
+        """
+        assert face in self._faces
+        assert dir in ['+', '-']
+        face = self.stored_face(face)
+        strips = self.edge_strips(face, depth)
+        values = []
+        for (side, kind, index, flip) in strips:
+            if kind == 'row':
+                values.append(self._get_row(side, index))
+            else:
+                values.append(self._get_col(side, index))
+        for num in range(0, 4):
+            if dir == '+':
+                # Strip num receives the next strip's stickers.
+                (side, kind, index, flip) = strips[num]
+                val = values[(num + 1) % 4]
+            else:
+                # The next strip receives strip num's stickers.
+                (side, kind, index, flip) = strips[(num + 1) % 4]
+                val = values[num]
+                flip = strips[num][3]
+            if flip:
+                val.reverse()
+            if kind == 'row':
+                self._set_row(side, index, val)
+            else:
+                self._set_col(side, index, val)
+        if depth == 0:
+            if dir == '+':
+                self._turn_cw(face)
+            else:
+                self._turn_ccw(face)
+        if depth == self.size - 1:
+            # The far layer carries the opposite face, which turns the
+            # other way as seen from its own side.
+            if dir == '+':
+                self._turn_ccw(OPPOSITE[face])
+            else:
+                self._turn_cw(OPPOSITE[face])
 
     def move_front(self):
         """
         Move the F (front) face one-quarter turn clockwise.
         """
-        self.rotate_face_cw('F')
-        l_col = self.get_col('L', self.size - 1)
-        r_col = self.get_col('R', 0)
-        u_row = self.get_row('U', self.size - 1)
-        d_row = self.get_row('D', 0)
-        l_col.reverse()
-        self.set_row('U', self.size - 1, l_col)
-        r_col.reverse()
-        self.set_row('D', 0, r_col)
-        self.set_col('R', 0, u_row)
-        self.set_col('L', self.size - 1, d_row)
+        self.move_face('F', '+')
+
+    def rotate_cube(self, axis, dir):
+        """
+        Rotate the cube as a whole around the given axis, by changing the
+        orientation frame only.
+
+        Arguments:
+          axis (str) - one of ['X', 'Y', 'Z']
+          dir  (str) - one of ['+', '-']
+        """
+        assert axis in ['X', 'Y', 'Z']
+        assert dir in ['+', '-']
+        (_, moves) = orientations()
+        self.frame = moves[self.frame][axis + dir]
+        self.changed = ALL_FACES
 
     def rotate_cube_x(self):
         """
         Rotate the cube in the positive X direction.
         """
-
-        up = self.face_contents['U']
-        front = self.face_contents['F']
-        back = self.face_contents['B']
-        down = self.face_contents['D']
-        self.face_contents['B'] = up
-        self.face_contents['U'] = front
-        self.face_contents['D'] = back
-        self.face_contents['F'] = down
-        self.rotate_face_cw('R')
-        self.rotate_face_ccw('L')
+        self.rotate_cube('X', '+')
 
     def rotate_cube_y(self):
         """
         Rotate the cube in the positive Y direction.
         """
-        front = self.face_contents['F']
-        back = self.face_contents['B']
-        left = self.face_contents['L']
-        right = self.face_contents['R']
-        self.face_contents['F'] = right
-        self.face_contents['B'] = left
-        self.face_contents['L'] = front
-        self.face_contents['R'] = back
-        self.rotate_face_ccw('D')
-        self.rotate_face_cw('U')
-        for num in range(0, 2):
-            self.rotate_face_cw('R')
-            self.rotate_face_cw('B')
+        self.rotate_cube('Y', '+')
 
     def rotate_cube_z(self):
         """
         Rotate the cube in the positive Z direction.
         """
-        down = self.face_contents['D']
-        right = self.face_contents['R']
-        up = self.face_contents['U']
-        left = self.face_contents['L']
-        self.face_contents['D'] = right
-        self.face_contents['R'] = up
-        self.face_contents['U'] = left
-        self.face_contents['L'] = down
-        self.rotate_face_ccw('B')
+        self.rotate_cube('Z', '+')
+
+    # Rotations that move the stickers, from which the frames are found.
+
+    def move_stickers_x(self):
+        """
+        Rotate the stored faces in the positive X direction.
+        """
+
+        self.changed = ALL_FACES
+        self.dirty = ALL_FACES
+        up = self._faces['U']
+        front = self._faces['F']
+        back = self._faces['B']
+        down = self._faces['D']
+        self._faces['B'] = up
+        self._faces['U'] = front
+        self._faces['D'] = back
+        self._faces['F'] = down
+        self._turn_cw('R')
+        self._turn_ccw('L')
+
+    def move_stickers_y(self):
+        """
+        Rotate the stored faces in the positive Y direction.
+        """
+        self.changed = ALL_FACES
+        self.dirty = ALL_FACES
+        front = self._faces['F']
+        back = self._faces['B']
+        left = self._faces['L']
+        right = self._faces['R']
+        self._faces['F'] = right
+        self._faces['B'] = left
+        self._faces['L'] = front
+        self._faces['R'] = back
+        self._turn_ccw('D')
+        self._turn_cw('U')
+        for num in range(0, 2):
+            self._turn_cw('R')
+            self._turn_cw('B')
+
+    def move_stickers_z(self):
+        """
+        Rotate the stored faces in the positive Z direction.
+        """
+        self.changed = ALL_FACES
+        self.dirty = ALL_FACES
+        down = self._faces['D']
+        right = self._faces['R']
+        up = self._faces['U']
+        left = self._faces['L']
+        self._faces['D'] = right
+        self._faces['R'] = up
+        self._faces['U'] = left
+        self._faces['L'] = down
+        self._turn_ccw('B')
         for charecter in 'FLURD':
-            self.rotate_face_cw(charecter)
+            self._turn_cw(charecter)
+
+    def apply_perm(self, perm):
+        """
+        Apply a facelet permutation in one step.
+
+        The facelets are numbered face by face in the order U, D, F, B, L,
+        R and row-major within a face; the new facelet i is the old facelet
+        perm[i].
+
+        Argument:
+            perm (tuple) - permutation of range(6 * size * size)
+        """
+        self.materialize()
+        old = []
+        for face in 'UDFBLR':
+            for row in self._faces[face]:
+                old.extend(row)
+        assert len(perm) == len(old)
+        self.touched += len(perm)
+        self.changed = ALL_FACES
+        self.dirty = ALL_FACES
+        index = 0
+        for face in 'UDFBLR':
+            rows = []
+            for num in range(0, self.size):
+                rows.append([old[i] for i in perm[index:index + self.size]])
+                index += self.size
+            self._faces[face] = rows
 
     def display(self):
         """
@@ -216,6 +566,96 @@ class RubiksRep:
 
         self.face_contents = rutils.test_faces(self.size)
 
+    def load_colors(self, colors):
+        """
+        Replace all the stickers.
+
+        Argument:
+            colors (str) - one color letter per sticker, face by face in
+                           the order U, D, F, B, L, R and row by row
+        """
+        size = self.size
+        assert len(colors) == 6 * size * size
+        faces = {}
+        index = 0
+        for face in 'UDFBLR':
+            rows = []
+            for _ in range(size):
+                rows.append(list(colors[index:index + size]))
+                index += size
+            faces[face] = rows
+        self.face_contents = faces
+
+
+def turn_grid(grid, turns):
+    """
+    Return a square list of rows turned clockwise 'turns' times, the way
+    rotate_face_cw turns a face.  The grid itself is returned unturned.
+    """
+    size = len(grid)
+    for _ in range(turns % 4):
+        grid = [[grid[size - 1 - col][row] for col in range(size)]
+                for row in range(size)]
+    return grid
+
+
+def orientations():
+    """
+    Return the 24 orientation frames of a cube and the rotations between
+    them, found by applying the sticker-moving rotations to a cube whose
+    stickers are labelled.
+
+    Return value: a tuple (frames, moves).  frames[i] gives, for each face
+    in FACE_ORDER, a pair (stored, turns): the face seen there is the
+    stored face 'stored' turned clockwise 'turns' times.  moves[i] maps a
+    rotation such as 'X+' to the index of the frame it leads to.  Frame 0
+    is the identity.
+    """
+    if 'frames' not in _frames:
+        labels = {}
+        for face in FACE_ORDER:
+            labels[face] = [[(face, row, col) for col in range(2)]
+                            for row in range(2)]
+        steps = {}
+        for axis in 'XYZ':
+            rep = RubiksRep(2)
+            rep.face_contents = copy.deepcopy(labels)
+            getattr(rep, 'move_stickers_' + axis.lower())()
+            step = []
+            for face in FACE_ORDER:
+                grid = rep._faces[face]
+                source = grid[0][0][0]
+                turns = [k for k in range(4)
+                         if turn_grid(labels[source], k) == grid]
+                step.append((source, turns[0]))
+            steps[axis + '+'] = step
+        start = tuple((face, 0) for face in FACE_ORDER)
+        frames = [start]
+        found = {start: 0}
+        moves = []
+        for frame in frames:
+            moves.append({})
+            for (name, step) in steps.items():
+                nxt = []
+                for (source, turns) in step:
+                    (stored, before) = frame[FACE_ORDER.index(source)]
+                    nxt.append((stored, (before + turns) % 4))
+                nxt = tuple(nxt)
+                if nxt not in found:
+                    found[nxt] = len(frames)
+                    frames.append(nxt)
+                moves[-1][name] = found[nxt]
+        assert len(frames) == 24
+        for move in moves:
+            for axis in 'XYZ':
+                # A quarter turn back is three quarter turns forward.
+                frame = move[axis + '+']
+                for _ in range(2):
+                    frame = moves[frame][axis + '+']
+                move[axis + '-'] = frame
+        _frames['frames'] = (frames, moves)
+    return _frames['frames']
+
 
 if __name__ == '__main__':
     rep = RubiksRep(3)
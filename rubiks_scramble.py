@@ -0,0 +1,184 @@
+"""
+Thierno Diallo
+tdiallo@caltech.edu
+
+Bulk scramble generation.
+
+Scrambles are made in chunks.  Every chunk has its own random number
+generator, seeded from the overall seed and the chunk number, so the
+output for a given seed is the same no matter how many processes share
+the work.  Output is streamed to a JSON-lines or binary file as chunks
+finish, in chunk order.
+"""
+
+import argparse
+import json
+import multiprocessing
+import random
+import struct
+from rubiks_flat import RubiksFlatRep
+from rubiks_key import state_key
+
+# Face moves in the order used by the binary format.
+MOVES = [face + dir for face in 'UDFBLR' for dir in '+-']
+CHUNK = 1000
+BINARY_MAGIC = b'RSCR'
+BINARY_VERSION = 1
+
+
+def chunk_rng(seed, chunk):
+    """
+    Return the random number generator of a chunk.
+    """
+    return random.Random(f'{seed}/{chunk}')
+
+
+def make_scramble(size, nmoves, rng):
+    """
+    Make one scramble.
+
+    Arguments:
+      size (int) - dimension of cube
+      nmoves (int) - number of random face moves
+      rng (random.Random) - random number generator
+
+    Return value: a tuple (moves, key) of the move indices into MOVES and
+    the canonical key of the resulting state
+    """
+    rep = RubiksFlatRep(size)
+    moves = [rng.randrange(len(MOVES)) for _ in range(nmoves)]
+    for move in moves:
+        rep.apply_move(MOVES[move])
+    return (moves, state_key(rep))
+
+
+def make_chunk(args):
+    """
+    Make the scrambles of one chunk.
+
+    Arguments:
+      args (tuple) - (size, nmoves, seed, chunk, count)
+
+    Return value: a list of (moves, key) tuples
+    """
+    (size, nmoves, seed, chunk, count) = args
+    rng = chunk_rng(seed, chunk)
+    return [make_scramble(size, nmoves, rng) for _ in range(count)]
+
+
+def _jobs(size, count, nmoves, seed):
+    """
+    Yield the chunk arguments for 'count' scrambles.
+    """
+    for chunk in range((count + CHUNK - 1) // CHUNK):
+        yield (size, nmoves, seed, chunk,
+               min(CHUNK, count - chunk * CHUNK))
+
+
+def generate_scrambles(size, count, seed, nmoves=50, processes=None):
+    """
+    Generate scrambles across a pool of processes, in a fixed order.
+
+    Arguments:
+      size (int) - dimension of cube
+      count (int) - number of scrambles
+      seed - seed of the whole run (any int or str)
+      nmoves (int) - number of random face moves per scramble
+      processes (int) - worker processes (all cores by default; 1 runs
+                        in this process)
+
+    Return value: a generator of (moves, key) tuples
+    """
+    jobs = _jobs(size, count, nmoves, seed)
+    if processes == 1:
+        for job in jobs:
+            yield from make_chunk(job)
+        return
+    with multiprocessing.Pool(processes) as pool:
+        for scrambles in pool.imap(make_chunk, jobs):
+            yield from scrambles
+
+
+def move_string(moves):
+    """
+    Return move indices as RubiksControl commands, e.g. "u r' f".
+    """
+    cmds = []
+    for move in moves:
+        cmd = MOVES[move][0].lower()
+        if MOVES[move][1] == '-':
+            cmd += "'"
+        cmds.append(cmd)
+    return ' '.join(cmds)
+
+
+def key_bytes(size):
+    """
+    Return the number of bytes needed to store a key of the given size.
+    """
+    return ((6 ** (6 * size * size) - 1).bit_length() + 7) // 8
+
+
+def write_scrambles(filename, size, count, seed, nmoves=50,
+                    binary=False, processes=None):
+    """
+    Generate scrambles and stream them to a file.
+
+    The text format has one JSON object per line with the keys 'moves'
+    (RubiksControl commands) and 'key'.  The binary format has a header
+    (magic, version, size, number of moves, key length) followed by one
+    fixed-size record per scramble: a byte per move (an index into
+    MOVES) and the key, big-endian.
+
+    Arguments: as for generate_scrambles, plus
+      filename (str) - the output file
+      binary (bool) - True for the binary format
+    """
+    scrambles = generate_scrambles(size, count, seed, nmoves, processes)
+    if binary:
+        length = key_bytes(size)
+        with open(filename, 'wb') as outfile:
+            outfile.write(BINARY_MAGIC)
+            outfile.write(struct.pack('<BBHH', BINARY_VERSION, size,
+                                      nmoves, length))
+            for (moves, key) in scrambles:
+                outfile.write(bytes(moves))
+                outfile.write(key.to_bytes(length, 'big'))
+    else:
+        with open(filename, 'w') as outfile:
+            for (moves, key) in scrambles:
+                record = {'moves': move_string(moves), 'key': key}
+                print(json.dumps(record), file=outfile)
+
+
+def read_scrambles(filename):
+    """
+    Read back a binary scramble file written by write_scrambles.
+
+    Return value: a generator of (moves, key) tuples
+    """
+    with open(filename, 'rb') as infile:
+        assert infile.read(4) == BINARY_MAGIC
+        (version, size, nmoves, length) = struct.unpack('<BBHH',
+                                                        infile.read(6))
+        assert version == BINARY_VERSION
+        while True:
+            record = infile.read(nmoves + length)
+            if not record:
+                break
+            yield (list(record[:nmoves]),
+                   int.from_bytes(record[nmoves:], 'big'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate cube scrambles.')
+    parser.add_argument('filename')
+    parser.add_argument('count', type=int)
+    parser.add_argument('--size', type=int, default=3)
+    parser.add_argument('--seed', default='0')
+    parser.add_argument('--moves', type=int, default=50)
+    parser.add_argument('--binary', action='store_true')
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+    write_scrambles(args.filename, args.size, args.count, args.seed,
+                    args.moves, args.binary, args.processes)
@@ -0,0 +1,431 @@
+"""
+Thierno Diallo
+tdiallo@caltech.edu
+
+Iterative-deepening A* (IDA*) search for Rubik's cubes of any size.
+
+The search copies the cube once into a RubiksFlatRep, whose moves
+change its facelet array in place, and then makes and unmakes quarter
+turns of the six faces on it, so no state is copied at each step.  It
+finds a solution in the fewest quarter turns the heuristics allow.  A
+heuristic is any function of (facelets, size) returning a lower bound on
+the number of quarter turns left, where facelets is a bytes or bytearray
+object of color codes as from rubiks_key.rep_facelets; it is given the
+search's own facelet array, which it must not change.  The search uses
+the largest of its heuristics.  Available heuristics are
+
+    misplaced      facelets that must change color, for any size
+    CornerTable    the 2x2x2 distance table of rubiks_solve2 applied to
+                   the corners, for 2x2x2 and 3x3x3 cubes
+    Phase1Table    the phase 1 pruning tables of rubiks_solve3, for
+                   3x3x3 cubes
+
+On cubes bigger than 3x3x3 the inner layers turn too (see layer_moves).
+Redundant sequences are never searched: no move is followed by its
+inverse, the same layer turns at most twice in a row (and a half turn
+only clockwise) and the layers of an axis, which commute, turn only in
+order of depth from the first face of the axis in FACES.  A transposition table, keyed by a hash of the
+facelets and the last move, can skip states already searched with as
+many moves left.  Keeping only hashes keeps the table small, at the risk
+(about one in 2**64 per pair of states) of a collision skipping a state
+that wasn't searched.
+"""
+
+import operator  # operator.itemgetter for gathering facelets
+import time
+import rubiks_cubies as cubies
+from rubiks_flat import FACES, RubiksFlatRep
+from rubiks_key import rep_facelets
+from rubiks_rep import OPPOSITE
+from rubiks_solve2 import Solver2, FIXED, FREE
+from rubiks_solve2 import NTWIST as NTWIST2
+from rubiks_solve3 import Solver3, NTWIST, NFLIP, SLICE_EDGES, slice_coord
+
+# Returned by the search when it finds a solution.
+FOUND = -1
+
+# The moves and their successors, found once per cube size.
+_moves = {}
+
+
+# Heuristics.
+
+def misplaced(facelets, size):
+    """
+    Return a lower bound on the quarter turns needed to solve a cube of
+    any size, from the number of facelets that must change color (on
+    each face, all but those of its most common color) and the number a
+    face turn can change, which no inner layer turn changes more of.
+    """
+    area = size * size
+    wrong = 0
+    for start in range(0, 6 * area, area):
+        face = facelets[start:start + area]
+        wrong += area - max(face.count(code) for code in set(face))
+    # A face turn moves the stickers next to the face and all those on it
+    # but the center.
+    moved = 4 * size + area - (size % 2)
+    return -(-wrong // moved)
+
+
+def _center_table(facelets, size):
+    """
+    Return a bytes.translate table that recolors the facelets of an odd
+    cube so each center has its own face's color code.
+    """
+    area = size * size
+    middle = area // 2
+    return bytes.maketrans(bytes(facelets[face * area + middle]
+                                 for face in range(len(FACES))),
+                           bytes(range(len(FACES))))
+
+
+class CornerTable:
+    """
+    Exact quarter-turn distance of the corners, from the 2x2x2 distance
+    table.  On a 3x3x3 cube the corners move as on a 2x2x2 one.
+    """
+
+    def __init__(self, solver=None, limit=1000000):
+        """
+        Arguments:
+            solver (Solver2) - the 2x2x2 solver whose table to use
+            limit (int) - most distances to remember
+        """
+        if solver is None:
+            solver = Solver2()
+        self.solver = solver
+        self.limit = limit
+        # Distances found so far, by the colors of the corners.
+        self.distances = {}
+        # The facelets of the DBL position and a gather of all the corner
+        # facelets, by cube size.
+        self.places = {}
+        # Maps the colors of a corner, read in the order of a position's
+        # facelets, to the corner's index among the free corners (see
+        # rubiks_solve2) and its twist.
+        self.corners = {}
+        for (c, name) in enumerate(cubies.CORNERS):
+            codes = [FACES.index(face) for face in name]
+            for twist in range(3):
+                colors = bytes(codes[(k - twist) % 3] for k in range(3))
+                self.corners[colors] = (FREE.index(c) if c in FREE else None,
+                                        twist)
+        self.home = [FACES.index(face) for face in 'DBL']
+
+    def __call__(self, facelets, size):
+        if size not in self.places:
+            (corners, _) = cubies.geometry(size)
+            self.places[size] = (
+                operator.itemgetter(*corners[FIXED]),
+                operator.itemgetter(*[i for places in corners
+                                      for i in places]))
+        (home, gather) = self.places[size]
+        # Recolor so the corner in the DBL position is the DBL corner; a
+        # recoloring by a whole-cube rotation doesn't change the distance.
+        colors = list(home(facelets))
+        table = bytes.maketrans(
+            bytes(colors + [code ^ 1 for code in colors]),
+            bytes(self.home + [code ^ 1 for code in self.home]))
+        key = bytes(gather(facelets)).translate(table)
+        if key not in self.distances:
+            if len(self.distances) >= self.limit:
+                self.distances = {}
+            self.distances[key] = self.distance(key)
+        return self.distances[key]
+
+    def distance(self, key):
+        """
+        Return the distance of the corners, given their recolored colors
+        as made by __call__.
+        """
+        (perm, twist) = ([], [])
+        for pos in FREE:
+            (c, t) = self.corners[key[3 * pos:3 * pos + 3]]
+            perm.append(c)
+            twist.append(t)
+        index = cubies.perm_to_index(perm) * NTWIST2 + \
+            cubies.twist_to_index(twist)
+        return len(self.solver.solve_index(index))
+
+
+class Phase1Table:
+    """
+    Distance to the subgroup G1 of rubiks_solve3, from its phase 1
+    pruning tables.  It counts a half turn as one move, so it is also a
+    lower bound in quarter turns.
+    """
+
+    def __init__(self, solver=None, limit=1000000):
+        """
+        Arguments:
+            solver (Solver3) - the 3x3x3 solver whose tables to use
+            limit (int) - most distances to remember
+        """
+        if solver is None:
+            solver = Solver3()
+        self.solver = solver
+        self.limit = limit
+        # Distances found so far, by the colors of the corners and edges
+        # recolored by axis.
+        self.distances = {}
+        (corners, edges) = cubies.geometry(3)
+        self.gather = operator.itemgetter(*[i for places in corners + edges
+                                            for i in places])
+        # Recoloring of each face's color code to its axis: 0 for U and
+        # D, 1 for F and B and 2 for L and R.
+        self.axes = bytes.maketrans(bytes(range(len(FACES))),
+                                    bytes(code // 2
+                                          for code in range(len(FACES))))
+
+    def __call__(self, facelets, size):
+        assert size == 3
+        # Phase 1 only tells the faces of an axis apart by the centers.
+        key = bytes(self.gather(facelets)).translate(
+            _center_table(facelets, 3)).translate(self.axes)
+        if key not in self.distances:
+            if len(self.distances) >= self.limit:
+                self.distances = {}
+            self.distances[key] = self.distance(key)
+        return self.distances[key]
+
+    def distance(self, key):
+        """
+        Return the phase 1 distance, given the axes of the corner and edge
+        colors as made by __call__.
+        """
+        twist = []
+        for pos in range(len(cubies.CORNERS)):
+            twist.append(key[3 * pos:3 * pos + 3].index(0))
+        (flip, ep) = ([], [])
+        start = 3 * len(cubies.CORNERS)
+        for pos in range(len(cubies.EDGES)):
+            (a, b) = key[start + 2 * pos:start + 2 * pos + 2]
+            # An edge is named by its U or D face, or else its F or B
+            # face, first.
+            flip.append(0 if a == 0 or (a == 1 and b == 2) else 1)
+            ep.append(0 if 0 in (a, b) else SLICE_EDGES[0])
+        (twist, flip) = (cubies.twist_to_index(twist),
+                         cubies.flip_to_index(flip))
+        slc = slice_coord(ep)
+        return max(self.solver.slice_twist_prune[slc * NTWIST + twist],
+                   self.solver.slice_flip_prune[slc * NFLIP + flip])
+
+
+def default_heuristics(size):
+    """
+    Return the best heuristics available for a cube size.
+    """
+    if size == 2:
+        return [CornerTable()]
+    if size == 3:
+        return [CornerTable(), Phase1Table()]
+    return [misplaced]
+
+
+# Search.
+
+def layer_moves(size):
+    """
+    Return the moves searched on a cube of a size, as (face, depth, dir)
+    tuples: the quarter turns of the six faces and, on cubes bigger than
+    3x3x3, of the inner layers, each counted from the nearer face.  The
+    middle layer of an odd cube is counted from the first face of its
+    axis in FACES only.  (A 3x3x3 cube's middle layers aren't searched,
+    since turning one is the same as turning its two faces, and the cube
+    needn't end up in any particular orientation.)
+    """
+    depths = [0] if size <= 3 else range(size // 2)
+    moves = []
+    for face in FACES:
+        face_depths = list(depths)
+        if size > 3 and size % 2 == 1 and FACES.index(face) % 2 == 0:
+            face_depths.append(size // 2)
+        for depth in face_depths:
+            for dir in '+-':
+                moves.append((face, depth, dir))
+    return moves
+
+
+def _layer(move, size):
+    """
+    Return the (axis, layer) of a move: the first face of its axis in
+    FACES and the layer's depth from that face.
+    """
+    (face, depth, _) = move
+    if FACES.index(face) % 2 == 0:
+        return (face, depth)
+    return (OPPOSITE[face], size - 1 - depth)
+
+
+def _successors(moves, size):
+    """
+    Return, for each last move (or none, len(moves)) and whether it was
+    made twice in a row, the moves that may follow.
+    """
+    successors = []
+    for last in range(len(moves) + 1):
+        row = []
+        for repeated in [False, True]:
+            allowed = []
+            for (m, move) in enumerate(moves):
+                if last < len(moves):
+                    (axis, layer) = _layer(move, size)
+                    (last_axis, last_layer) = _layer(moves[last], size)
+                    (dir, last_dir) = (move[2], moves[last][2])
+                    if layer == last_layer and axis == last_axis and \
+                            (dir != last_dir or dir == '-' or repeated):
+                        continue
+                    # Layers of an axis commute, so they turn only in
+                    # order of depth.
+                    if axis == last_axis and layer < last_layer:
+                        continue
+                allowed.append(m)
+            row.append(allowed)
+        successors.append(row)
+    return successors
+
+
+def moves_and_successors(size):
+    """
+    Return the moves of a cube size and their successors (see above).
+    """
+    if size not in _moves:
+        moves = layer_moves(size)
+        _moves[size] = (moves, _successors(moves, size))
+    return _moves[size]
+
+
+class Search:
+    """
+    This class solves cubes of any size by IDA* search.
+    """
+
+    def __init__(self, heuristics=None, transpositions=0):
+        """
+        Arguments:
+            heuristics (list) - heuristic functions (see above); by default
+                                the best ones for each cube's size
+            transpositions (int) - most states to keep in the
+                                   transposition table, or 0 for none.
+                                   With redundant moves pruned it seldom
+                                   saves enough states to pay for itself
+                                   on a 3x3x3 cube.
+        """
+        self.heuristics = heuristics
+        self.transpositions = transpositions
+        # The default heuristics of each size, made when first needed and
+        # kept, with the distances they remember, for later searches.
+        self._defaults = {}
+        # Number of states reached by the last search.
+        self.nodes = 0
+
+    def estimate(self, facelets):
+        """
+        Return the largest lower bound of the heuristics.
+        """
+        return max(h(facelets, self.size) for h in self.current)
+
+    def solve(self, cube, max_depth=20, timeout=None):
+        """
+        Find a solution of a RubiksCube in the fewest quarter turns.  The
+        cube itself isn't moved.
+
+        Arguments:
+          cube (RubiksCube) - the cube to solve
+          max_depth (int) - longest solution to look for
+          timeout (float) - seconds after which to give up, or None
+
+        Return value: a list of RubiksControl commands, or None if there
+        is no solution of at most max_depth moves or time ran out
+        """
+        self.size = cube.rep.size
+        self.rep = RubiksFlatRep(self.size)
+        self.rep.facelets = rep_facelets(cube.rep)
+        # The facelet array, which the moves change in place.
+        self.facelets = self.rep.facelets
+        (self.moves, self.successors) = moves_and_successors(self.size)
+        self.current = self.heuristics
+        if self.current is None:
+            if self.size not in self._defaults:
+                self._defaults[self.size] = default_heuristics(self.size)
+            self.current = self._defaults[self.size]
+        self.deadline = None if timeout is None else time.time() + timeout
+        self.path = []
+        self.nodes = 0
+        bound = self.estimate(self.facelets)
+        while bound <= max_depth:
+            self.table = {}
+            result = self._search(0, bound, len(self.moves), 0)
+            if result == FOUND:
+                return [(str(depth + 1) if depth else '') + face.lower() +
+                        ("'" if dir == '-' else '')
+                        for (face, depth, dir) in
+                        (self.moves[m] for m in self.path)]
+            if result is None:
+                break
+            bound = result
+        return None
+
+    def _search(self, depth, bound, last, repeated):
+        """
+        Search below the current state, made with 'depth' moves, up to
+        'bound' moves in all.
+
+        Return value: FOUND (the moves are left in self.path), the
+        smallest bound beyond this one that could find more, or None if
+        time ran out
+        """
+        self.nodes += 1
+        facelets = self.facelets
+        for h in self.current:
+            # Stop at the first heuristic that rules this state out.
+            total = depth + h(facelets, self.size)
+            if total > bound:
+                return total
+        if self.rep.is_solved():
+            return FOUND
+        if self.deadline is not None and time.time() > self.deadline:
+            return None
+        if self.transpositions:
+            key = hash((bytes(facelets), last, repeated))
+            if self.table.get(key, bound + 1) <= depth:
+                return bound + 1
+            if len(self.table) < self.transpositions:
+                self.table[key] = depth
+        smallest = float('inf')
+        rep = self.rep
+        for m in self.successors[last][repeated]:
+            (face, layer, dir) = self.moves[m]
+            undo = '-' if dir == '+' else '+'
+            if layer == 0:
+                rep.move_face(face, dir)
+            else:
+                rep.move_layer(face, layer, dir)
+            self.path.append(m)
+            result = self._search(depth + 1, bound, m, m == last)
+            if layer == 0:
+                rep.move_face(face, undo)
+            else:
+                rep.move_layer(face, layer, undo)
+            if result == FOUND:
+                return FOUND
+            self.path.pop()
+            if result is None:
+                return None
+            smallest = min(smallest, result)
+        return smallest
+
+
+if __name__ == '__main__':
+    import random
+    from rubiks_cube import RubiksCube
+    for (size, depth) in [(2, 10), (3, 9)]:
+        cube = RubiksCube(size, 'flat')
+        for _ in range(depth):
+            cube.move_face(random.choice(FACES), random.choice('+-'))
+        search = Search()
+        start = time.time()
+        solution = search.solve(cube)
+        print(f'{size}x{size}x{size}: {" ".join(solution)} '
+              f'({search.nodes} nodes, {time.time() - start:.2f} s)')
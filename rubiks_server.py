@@ -0,0 +1,261 @@
+"""
+Thierno Diallo
+tdiallo@caltech.edu
+
+Rubik's cube server for many players at once.
+
+One asyncio task serves every connection, over TCP or a Unix socket,
+and each connection gets its own RubiksControl session.  The sessions
+share one read-only library of compiled user commands (see
+rubiks_library), one solver and the move tables of rubiks_flat, so an
+idle session holds little more than its cube.
+
+The protocol is line based.  The client sends one request per line and
+the server answers each one with a JSON object on one line:
+
+    <command line>      run a command line, as in RubiksControl.play
+    undo, redo          undo or redo a command line
+    name : cmds         add a user command
+    load <name>         load user commands from a file in the server's
+                        macro directory
+    state               the move count, whether the cube is solved, its
+                        state key and the cube in the compact style
+    solve               a solution of the cube (2x2x2 and 3x3x3 only)
+    q, quit             close the connection
+
+Answers hold 'count' and 'solved' after every change, or 'error' if the
+request was invalid.
+"""
+
+import argparse
+import asyncio
+import concurrent.futures  # a worker thread for solving cubes
+import json
+import os
+import tempfile
+import rubiks_library
+import rubiks_render
+from rubiks_control import RubiksControl, InvalidCommand, make_solver
+from rubiks_cube import InvalidCube
+
+
+def default_library(size, simplify=True):
+    """
+    Compile the default user commands (from rubiks_utils) into a library
+    for one cube size.  The file is removed once open, since the memory
+    map keeps it readable.
+    """
+    control = RubiksControl(size, scramble=False, checkpoint_interval=0,
+                            simplify=simplify)
+    (handle, filename) = tempfile.mkstemp(suffix='.rlib')
+    os.close(handle)
+    try:
+        control.save_library(filename, [size])
+        return rubiks_library.Library(filename)
+    finally:
+        os.remove(filename)
+
+
+class Server:
+    """
+    This class serves RubiksControl sessions to many clients.
+    """
+
+    def __init__(self, size=3, engine='flat', library=None, macro_dir=None,
+                 scramble=True, uniform=False, simplify=True,
+                 history_limit=100):
+        """
+        Set up the state shared by all sessions.
+
+        Arguments:
+            size (int) - the size of every session's cube
+            engine (str) - cube representation, 'list' or 'flat'
+            library (rubiks_library.Library) - the user commands every
+                         session starts with (the rubiks_utils ones by
+                         default)
+            macro_dir (str) - directory 'load' may read files from, or
+                         None to refuse 'load'
+            scramble (bool) - True to scramble each new session's cube
+            uniform (bool) - True to scramble to a uniformly random state
+            simplify (bool) - True to simplify command lines
+            history_limit (int) - most command lines each session can
+                         undo, so a session's journal doesn't grow
+                         without limit
+        """
+        if library is None:
+            library = default_library(size, simplify)
+        self.size = size
+        self.engine = engine
+        self.library = library
+        self.macro_dir = macro_dir
+        self.scramble = scramble
+        self.uniform = uniform
+        self.simplify = simplify
+        self.history_limit = history_limit
+        # One solver for all sessions, so its tables are loaded once.
+        self.solver = make_solver(size)
+        # Solving takes long enough to hold up every session, so it is
+        # done in a worker thread, one solve at a time since the solver is
+        # shared.
+        self.solver_thread = concurrent.futures.ThreadPoolExecutor(1)
+        # Number of open sessions and of sessions ever opened.
+        self.open = 0
+        self.opened = 0
+
+    def new_session(self):
+        """
+        Return a RubiksControl for a new connection.
+        """
+        return RubiksControl(self.size, self.scramble, self.engine,
+                             checkpoint_interval=0, simplify=self.simplify,
+                             uniform=self.uniform, library=self.library,
+                             solver=self.solver,
+                             history_limit=self.history_limit)
+
+    def load_path(self, name):
+        """
+        Return the path of a file of the macro directory, raising
+        InvalidCommand if loading isn't allowed or the name isn't a plain
+        file name.
+        """
+        if self.macro_dir is None:
+            raise InvalidCommand('Loading commands is not allowed.')
+        if os.path.basename(name) != name or name in ['.', '..']:
+            raise InvalidCommand(f'Invalid file name: {name}')
+        path = os.path.join(self.macro_dir, name)
+        if not os.path.isfile(path):
+            raise InvalidCommand(f'No such file: {name}')
+        return path
+
+    def respond(self, control, line):
+        """
+        Carry out one request of a session.
+
+        Arguments:
+          control (RubiksControl) - the session
+          line (str) - the request
+
+        Return value: the answer, as a dictionary
+        """
+        cmds = line.split()
+        try:
+            if len(cmds) == 0:
+                return {}
+            if len(cmds) == 1 and cmds[0] == 'state':
+                answer = control.checkpoint(['count', 'solved', 'key'])
+                answer['cube'] = \
+                    rubiks_render.Renderer('compact').render(control.cube.rep)
+                return answer
+            if len(cmds) == 1 and cmds[0] in ['-', 'undo']:
+                control.undo_command()
+            elif len(cmds) == 1 and cmds[0] in ['+', 'redo']:
+                control.redo_command()
+            elif len(cmds) == 2 and cmds[0] == 'load':
+                control.exec_load_commands(self.load_path(cmds[1]))
+            elif len(cmds) > 2 and cmds[1] == ':':
+                control.exec_add_command(cmds[0], cmds[2:])
+            else:
+                control.exec_line(cmds)
+        except (InvalidCommand, OSError, AssertionError) as err:
+            return {'error': str(err) or 'Invalid request.'}
+        except Exception as err:
+            # Anything else (e.g. a RecursionError from user commands
+            # nested too deeply, or a damaged library) fails the request
+            # but not the session.
+            return {'error': f'{type(err).__name__}: {err}'}
+        return control.checkpoint(['count', 'solved'])
+
+    def solve(self, control):
+        """
+        Answer a session's 'solve' request.  This runs in the solver's
+        worker thread; the session's cube doesn't change meanwhile, since
+        the session waits for the answer.
+        """
+        try:
+            cmds = control.solution()
+        except (InvalidCommand, InvalidCube) as err:
+            return {'error': str(err)}
+        except Exception as err:
+            return {'error': f'{type(err).__name__}: {err}'}
+        if cmds is None:
+            return {'error': 'No solution was found.'}
+        return {'solution': cmds}
+
+    async def answer(self, control, line):
+        """
+        Carry out one request of a session, leaving solves to the worker
+        thread so the other sessions carry on meanwhile.
+        """
+        if line.split() == ['solve']:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.solver_thread,
+                                              self.solve, control)
+        return self.respond(control, line)
+
+    async def handle(self, reader, writer):
+        """
+        Serve one connection until the client quits or hangs up.
+        """
+        control = self.new_session()
+        self.open += 1
+        self.opened += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.decode(errors='replace')
+                if line.split()[:1] in [['q'], ['quit']]:
+                    break
+                answer = await self.answer(control, line)
+                writer.write(json.dumps(answer).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            # The client hung up, or sent a line longer than the limit.
+            pass
+        finally:
+            self.open -= 1
+            control.close()
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765, path=None):
+        """
+        Serve clients forever, on a Unix socket if a path is given and on
+        TCP otherwise.
+        """
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle, path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve Rubik's cubes.")
+    parser.add_argument('--size', type=int, default=3)
+    parser.add_argument('--engine', default='flat', choices=['list', 'flat'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH',
+                        help='listen on a Unix socket instead of TCP')
+    parser.add_argument('--library', help='binary library of user commands')
+    parser.add_argument('--macro-dir',
+                        help="directory of files clients may 'load'")
+    parser.add_argument('--no-scramble', action='store_true')
+    parser.add_argument('--uniform', action='store_true',
+                        help='scramble to a uniformly random state')
+    parser.add_argument('--no-simplify', action='store_true')
+    parser.add_argument('--undo-limit', type=int, default=100,
+                        help='most command lines a session can undo')
+    args = parser.parse_args()
+    library = None
+    if args.library is not None:
+        library = rubiks_library.Library(args.library)
+    server = Server(args.size, args.engine, library, args.macro_dir,
+                    not args.no_scramble, args.uniform, not args.no_simplify,
+                    args.undo_limit)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
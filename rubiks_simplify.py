@@ -0,0 +1,233 @@
+"""
+Thierno Diallo
+tdiallo@caltech.edu
+
+Simplification of Rubik's cube command lines.
+
+Moves of the same axis commute, so every run of moves about one axis is
+collected into the number of quarter turns of each layer and written out
+again with as few commands as possible: "r r'" disappears, "r r r"
+becomes "r'" and "r l r'" becomes "l".  Whole-cube rotations are moved to
+the end of the line by renaming the faces of the moves after them, so
+"x u" becomes "f x".  Anything that isn't a built-in move, like a user
+command, is left in place and nothing is moved across it.
+"""
+
+import re  # re for parsing slice and wide moves
+from rubiks_rep import OPPOSITE, FACE_ORDER, orientations
+
+# Layer moves: an optional layer number, a face, an optional 'w' for a
+# wide move and an optional "'" for counterclockwise, e.g. "2r" (the
+# second layer from R), "rw" (R and the layer behind it) or "3uw'".
+LAYER_MOVE = re.compile(r"([1-9][0-9]*)?([udfblr])(w?)(')?")
+ROTATION = re.compile(r"([xyz])(')?")
+
+# Each axis is named by one of its two faces.
+AXES = {'U': 'U', 'D': 'U', 'F': 'F', 'B': 'F', 'R': 'R', 'L': 'R'}
+
+# Shortest rotation commands for each orientation frame, found once.
+_words = []
+
+# Parsed moves, by command and cube size.  Commands that aren't moves
+# aren't kept, since there can be any number of them.
+_parsed = {}
+
+
+def parse_move(cmd, size):
+    """
+    Parse a built-in move.
+
+    Arguments:
+      cmd (str) - a command string
+      size (int) - the size of the cube
+
+    Return value: None if the command isn't a built-in move of this cube,
+    otherwise a tuple (name, layers, dir) where name is a face ('U', 'D'...)
+    or an axis ('X', 'Y', 'Z'), layers is the list of layers moved counted
+    from the face (None for whole-cube rotations) and dir is '+' or '-'.
+    """
+    key = (cmd, size)
+    if key in _parsed:
+        return _parsed[key]
+    move = _parse_move(cmd, size)
+    if move is not None:
+        _parsed[key] = move
+    return move
+
+
+def _parse_move(cmd, size):
+    """
+    Parse a built-in move; see parse_move.
+    """
+    match = ROTATION.fullmatch(cmd)
+    if match is not None:
+        (axis, prime) = match.groups()
+        return (axis.upper(), None, '-' if prime else '+')
+    match = LAYER_MOVE.fullmatch(cmd)
+    if match is None:
+        return None
+    (number, face, wide, prime) = match.groups()
+    if number is None:
+        number = 2 if wide else 1
+    number = int(number)
+    if number > size:
+        return None
+    if wide:
+        layers = list(range(number))
+    else:
+        layers = [number - 1]
+    return (face.upper(), layers, '-' if prime else '+')
+
+
+def rotation_word(frame):
+    """
+    Return a shortest list of rotation commands (e.g. ['x', "y'"]) that
+    turns a cube in orientation frame 0 into the given frame.
+    """
+    if not _words:
+        (frames, moves) = orientations()
+        words = {0: []}
+        order = [0]
+        for index in order:
+            for axis in 'XYZ':
+                for dir in '+-':
+                    nxt = moves[index][axis + dir]
+                    if nxt not in words:
+                        cmd = axis.lower() + ("'" if dir == '-' else '')
+                        words[nxt] = words[index] + [cmd]
+                        order.append(nxt)
+        _words.extend(words[index] for index in range(len(frames)))
+    return list(_words[frame])
+
+
+def layer_commands(face, layers, turns):
+    """
+    Return the commands that turn some layers of a face together.
+
+    Arguments:
+      face (str) - the face the layers are counted from, e.g. 'R'
+      layers (list) - the layers, either [depth] or range(number)
+      turns (int) - clockwise quarter turns, 1, 2 or 3
+
+    Return value: a list of commands, e.g. ["3rw'"] or ['2u', '2u']
+    """
+    name = face.lower()
+    if len(layers) == 1:
+        if layers[0] != 0:
+            name = str(layers[0] + 1) + name
+    elif len(layers) == 2:
+        name += 'w'
+    else:
+        name = str(len(layers)) + name + 'w'
+    if turns == 3:
+        return [name + "'"]
+    return [name] * turns
+
+
+def axis_commands(axis, turns, size):
+    """
+    Return the commands for one axis, given the quarter turns of each
+    layer counted from the axis face.  Layers at either end that turn
+    together become one wide move.
+    """
+    cmds = []
+    (low, high) = (0, size - 1)
+    # Layers that turn with the axis face.
+    end = low
+    while end <= high and turns[end] == turns[low]:
+        end += 1
+    if turns[low] != 0:
+        cmds += layer_commands(axis, range(end - low), turns[low])
+        low = end
+    # Layers that turn with the opposite face.
+    end = high
+    while end >= low and turns[end] == turns[high]:
+        end -= 1
+    if low <= high and turns[high] != 0:
+        cmds += layer_commands(OPPOSITE[axis], range(high - end),
+                               -turns[high] % 4)
+        high = end
+    # Inner layers, each from its nearer face.
+    for depth in range(low, high + 1):
+        if turns[depth] == 0:
+            continue
+        if depth <= size - 1 - depth:
+            cmds += layer_commands(axis, [depth], turns[depth])
+        else:
+            cmds += layer_commands(OPPOSITE[axis], [size - 1 - depth],
+                                   -turns[depth] % 4)
+    return cmds
+
+
+def simplify(cmds, size, rotations=True):
+    """
+    Simplify a command line without changing what it does to the cube.
+
+    Arguments:
+      cmds (list) - the command strings of the line
+      size (int) - the size of the cube
+      rotations (bool) - False to drop the whole-cube rotation that the
+                         line leaves the cube in, when the cube's final
+                         orientation doesn't matter (e.g. for a solution)
+
+    Return value: a list of command strings
+    """
+    (frames, moves) = orientations()
+    # Each item is a command string that is kept as it is, or a list
+    # [axis, turns, moves] of the quarter turns of each layer about an
+    # axis and the moves (face, layers, turns) that made them, with their
+    # faces renamed.
+    items = []
+    frame = 0
+    for cmd in cmds:
+        move = parse_move(cmd, size)
+        if move is None:
+            # Put the cube back in its orientation before the command.
+            items += rotation_word(frame)
+            items.append(cmd)
+            frame = 0
+            continue
+        (name, layers, dir) = move
+        if layers is None:
+            frame = moves[frame][name + dir]
+            continue
+        face = name
+        if frame != 0:
+            face = frames[frame][FACE_ORDER.index(name)][0]
+        turns = 1 if dir == '+' else 3
+        renamed = (face, layers, turns)
+        axis = AXES[face]
+        if face != axis:
+            layers = [size - 1 - depth for depth in layers]
+            turns = -turns % 4
+        if not items or type(items[-1]) is not list or items[-1][0] != axis:
+            items.append([axis, [0] * size, []])
+        for depth in layers:
+            items[-1][1][depth] = (items[-1][1][depth] + turns) % 4
+        items[-1][2].append(renamed)
+        if not any(items[-1][1]):
+            # The moves cancelled; the moves before them may cancel too.
+            items.pop()
+    if rotations:
+        items += rotation_word(frame)
+    result = []
+    for item in items:
+        if type(item) is list:
+            (axis, turns, moves) = item
+            if len(moves) > 1:
+                merged = axis_commands(axis, turns, size)
+                # Splitting wide moves apart can take more commands than
+                # the moves had to begin with.
+                if len(merged) <= len(moves):
+                    result += merged
+                    continue
+            for move in moves:
+                result += layer_commands(*move)
+        else:
+            result.append(item)
+    return result
+
+
+if __name__ == '__main__':
+    for line in ["r r'", "r r r", "r l r'", "x u x'", "u d u' 2u"]:
+        print(f'{line} -> {" ".join(simplify(line.split(), 3))}')
@@ -0,0 +1,224 @@
+"""
+Thierno Diallo
+tdiallo@caltech.edu
+
+Optimal solver for 2x2x2 Rubik's cubes.
+
+The solver holds the distance to solved (in quarter turns) of all
+3,674,160 positions of the 2x2x2 cube.  The distances are found once by a
+breadth-first search and saved to disk at 2 bits per position, as the
+distance modulo 3; later runs memory-map the file.  Since every quarter
+turn changes the distance by exactly one, a solution is found by always
+moving to the neighbor whose stored value is one less (modulo 3).
+"""
+
+import mmap  # mmap for memory-mapping the distance table
+import os
+import rubiks_cubies as cubies
+from rubiks_cube import InvalidCube
+
+# Positions are described with the DBL corner fixed in place, so only
+# U, R and F turns are needed.
+FIXED = cubies.CORNERS.index('DBL')
+FREE = [i for i in range(len(cubies.CORNERS)) if i != FIXED]
+MOVES = ['U+', 'U-', 'R+', 'R-', 'F+', 'F-']
+NPERM = 5040   # 7! placements of the free corners
+NTWIST = 729   # 3^6 twists of the free corners
+NSTATES = NPERM * NTWIST
+UNSEEN = 255
+
+
+def encode(facelets):
+    """
+    Return the state index of a 2x2x2 cube whose DBL corner is solved.
+
+    Arguments:
+      facelets (bytes) - color codes in the layout of RubiksFlatRep
+
+    Return value: an int in range(NSTATES)
+    """
+    (cp, co, _, _) = cubies.to_cubies(2, facelets)
+    if cp[FIXED] != FIXED or co[FIXED] != 0:
+        raise InvalidCube('The DBL corner of the cube is not solved.')
+    perm = [FREE.index(cp[i]) for i in FREE]
+    twist = [co[i] for i in FREE]
+    if sum(twist) % 3 != 0:
+        raise InvalidCube('A corner of the cube is twisted.')
+    return (cubies.perm_to_index(perm) * NTWIST +
+            cubies.twist_to_index(twist))
+
+
+def decode(index):
+    """
+    Return the facelets of the state with the given index.
+    This is the inverse of encode.
+    """
+    (perm_index, twist_index) = divmod(index, NTWIST)
+    perm = cubies.index_to_perm(perm_index, len(FREE))
+    twist = cubies.index_to_twist(twist_index, len(FREE))
+    cp = list(range(len(cubies.CORNERS)))
+    co = [0] * len(cubies.CORNERS)
+    for (k, i) in enumerate(FREE):
+        cp[i] = FREE[perm[k]]
+        co[i] = twist[k]
+    return cubies.from_cubies(2, cp, co)
+
+
+def normalize(facelets):
+    """
+    Find the whole-cube rotation that brings the DBL corner of a cube
+    home, untwisted.
+
+    Return value: a tuple (word, facelets) of the rotation commands and
+    the facelets of the rotated cube.
+    """
+    (corners, _) = cubies.geometry(2)
+    home = tuple(cubies.FACES.index(face) for face in 'DBL')
+    for (perm, word) in cubies.rotations(2):
+        rotated = cubies.gather(facelets, perm)
+        if tuple(rotated[i] for i in corners[FIXED]) == home:
+            return (word, rotated)
+    raise InvalidCube('The cube does not have a DBL corner.')
+
+
+def move_table():
+    """
+    Return a list of (perm_moves, twist_moves) pairs, one per move in
+    MOVES, mapping each coordinate to its value after the move.
+    """
+    actions = cubies.cubie_moves(2)
+    moves = []
+    for move in MOVES:
+        (cperm, ctwist, _, _) = actions[move]
+        # The moves keep the DBL corner home, so they act on the free
+        # corners alone.
+        free_perm = [FREE.index(cperm[i]) for i in FREE]
+        free_twist = [ctwist[i] for i in FREE]
+        perm_moves = []
+        for index in range(NPERM):
+            perm = cubies.index_to_perm(index, len(FREE))
+            perm_moves.append(
+                cubies.perm_to_index([perm[i] for i in free_perm]))
+        twist_moves = []
+        for index in range(NTWIST):
+            twist = cubies.index_to_twist(index, len(FREE))
+            twist_moves.append(cubies.twist_to_index(
+                [(twist[i] + t) % 3 for (i, t) in zip(free_perm, free_twist)]))
+        moves.append((perm_moves, twist_moves))
+    return moves
+
+
+def build_table(filename, moves=None):
+    """
+    Find the distance of every state by breadth-first search and save it
+    to a file, 2 bits per state holding the distance modulo 3.
+
+    Arguments:
+      filename (str) - file to write the table to
+      moves (list) - the result of move_table(), if already computed
+    """
+    if moves is None:
+        moves = move_table()
+    dist = bytearray([UNSEEN]) * NSTATES
+    dist[0] = 0
+    frontier = [0]
+    depth = 0
+    while frontier:
+        depth += 1
+        nxt = []
+        for index in frontier:
+            (perm, twist) = divmod(index, NTWIST)
+            for (perm_moves, twist_moves) in moves:
+                new = perm_moves[perm] * NTWIST + twist_moves[twist]
+                if dist[new] == UNSEEN:
+                    dist[new] = depth
+                    nxt.append(new)
+        frontier = nxt
+    packed = bytearray(NSTATES // 4)
+    for i in range(0, NSTATES, 4):
+        packed[i // 4] = ((dist[i] % 3) | (dist[i + 1] % 3) << 2 |
+                          (dist[i + 2] % 3) << 4 | (dist[i + 3] % 3) << 6)
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    # Write to a temporary file first so a partial table is never used.
+    with open(filename + '.tmp', 'wb') as outfile:
+        outfile.write(packed)
+    os.replace(filename + '.tmp', filename)
+
+
+class Solver2:
+    """
+    This class solves 2x2x2 cubes in the fewest quarter turns.
+    """
+
+    def __init__(self, filename=None):
+        """
+        Load the distance table, building it first if the file is missing.
+
+        Argument:
+            filename (str) - the table file; by default a file in
+                             rubiks_cubies.TABLE_DIR
+        """
+        if filename is None:
+            filename = os.path.join(cubies.TABLE_DIR, 'solve2_dist.bin')
+        self.moves = move_table()
+        if not os.path.exists(filename):
+            build_table(filename, self.moves)
+        with open(filename, 'rb') as infile:
+            self.table = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        assert len(self.table) == NSTATES // 4
+
+    def value(self, index):
+        """
+        Return the distance of a state modulo 3.
+        """
+        return (self.table[index >> 2] >> ((index & 3) << 1)) & 3
+
+    def solve_index(self, index):
+        """
+        Return the shortest list of moves (e.g. ['U+', 'R-']) that solves
+        the state with the given index.
+        """
+        solution = []
+        while index != 0:
+            (perm, twist) = divmod(index, NTWIST)
+            target = (self.value(index) - 1) % 3
+            for (move, (perm_moves, twist_moves)) in zip(MOVES, self.moves):
+                new = perm_moves[perm] * NTWIST + twist_moves[twist]
+                if self.value(new) == target:
+                    solution.append(move)
+                    index = new
+                    break
+        return solution
+
+    def distance(self, cube):
+        """
+        Return the number of quarter turns needed to solve a RubiksCube.
+        """
+        (_, facelets) = normalize(cubies.cube_facelets(cube))
+        return len(self.solve_index(encode(facelets)))
+
+    def solve(self, cube):
+        """
+        Return a shortest solution of a 2x2x2 RubiksCube.
+
+        Argument:
+            cube (RubiksCube) - the cube to solve; it is not changed.
+
+        Return value: a list of RubiksControl commands, starting with the
+        whole-cube rotations that bring the cube's DBL corner home.
+        """
+        assert cube.rep.size == 2
+        (word, facelets) = normalize(cubies.cube_facelets(cube))
+        cmds = list(word)
+        for move in self.solve_index(encode(facelets)):
+            cmds.append(move[0].lower() + ("'" if move[1] == '-' else ''))
+        return cmds
+
+
+if __name__ == '__main__':
+    from rubiks_cube import RubiksCube
+    solver = Solver2()
+    cube = RubiksCube(2)
+    cube.scramble()
+    print(cube.display())
+    print(' '.join(solver.solve(cube)))
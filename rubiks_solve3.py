@@ -0,0 +1,570 @@
+"""
+Thierno Diallo
+tdiallo@caltech.edu
+
+Two-phase solver for 3x3x3 Rubik's cubes (Kociemba's algorithm).
+
+Phase 1 brings the cube into the subgroup G1 = <U, D, R2, L2, F2, B2>,
+where all corners and edges are oriented and the four middle-layer edges
+are in the middle layer.  Phase 2 solves the cube using only moves of G1.
+Both phases are iterative-deepening searches over coordinates:
+
+    phase 1: twist (3^7), flip (2^11), slice (C(12, 4) positions)
+    phase 2: corner permutation (8!), U/D edge permutation (8!),
+             slice permutation (4!)
+
+The move and pruning tables are generated once, saved to
+rubiks_cubies.TABLE_DIR and memory-mapped on later runs.  The search
+counts face turns (a half turn is one move); solutions are returned as
+quarter-turn RubiksControl commands.
+"""
+
+import array  # array for writing the tables
+import mmap   # mmap for memory-mapping the tables
+import multiprocessing
+import os
+import time
+import rubiks_cubies as cubies
+from rubiks_cube import InvalidCube
+
+# The 18 face turns: each face a quarter turn clockwise, a half turn and
+# a quarter turn counterclockwise.
+MOVE_FACES = 'URFDLB'
+MOVES = [face + turn for face in MOVE_FACES for turn in '123']
+NMOVES = len(MOVES)
+# Moves that stay in G1.
+PHASE2_MOVES = [MOVES.index(name) for name in
+                ['U1', 'U2', 'U3', 'D1', 'D2', 'D3', 'R2', 'L2', 'F2', 'B2']]
+
+NTWIST = 2187     # 3^7
+NFLIP = 2048      # 2^11
+NSLICE = 495      # C(12, 4)
+NCORNER = 40320   # 8!
+NEDGE8 = 40320    # 8!
+NSLICEPERM = 24   # 4!
+
+# Longest phase 2 to search.  Deep phase 2 searches are slow and rarely
+# pay off; a longer phase 1 usually leads to a shorter phase 2 instead.
+MAX_PHASE2 = 12
+
+# The middle-layer edges and their home positions.
+SLICE_EDGES = [cubies.EDGES.index(name) for name in ['FR', 'FL', 'BL', 'BR']]
+
+# Bump when the table layout changes, so old files aren't used.
+TABLE_VERSION = 1
+TABLES = {
+    'twist_move': ('H', NTWIST * NMOVES),
+    'flip_move': ('H', NFLIP * NMOVES),
+    'slice_move': ('H', NSLICE * NMOVES),
+    'corner_move': ('H', NCORNER * NMOVES),
+    'edge8_move': ('H', NEDGE8 * NMOVES),
+    'sliceperm_move': ('H', NSLICEPERM * NMOVES),
+    'slice_twist_prune': ('B', NSLICE * NTWIST),
+    'slice_flip_prune': ('B', NSLICE * NFLIP),
+    'corner_prune': ('B', NCORNER * NSLICEPERM),
+    'edge8_prune': ('B', NEDGE8 * NSLICEPERM),
+}
+
+
+def _choose(n, k):
+    """
+    Return the binomial coefficient C(n, k), 0 if k > n.
+    """
+    if k > n:
+        return 0
+    result = 1
+    for i in range(k):
+        result = result * (n - i) // (i + 1)
+    return result
+
+
+# Coordinates of a cubie state (cp, co, ep, eo).
+
+def slice_coord(ep):
+    """
+    Return the index of the set of positions holding the middle-layer
+    edges; 0 when they are all in the middle layer.
+    """
+    index = 0
+    found = 0
+    for pos in range(11, -1, -1):
+        if ep[pos] in SLICE_EDGES:
+            found += 1
+            index += _choose(11 - pos, found)
+    return index
+
+
+def slice_edges(index):
+    """
+    Return an edge permutation whose middle-layer edges are at the
+    positions of a slice coordinate.  This is the inverse of slice_coord.
+    """
+    ep = [None] * 12
+    found = 4
+    for pos in range(12):
+        if found > 0 and index >= _choose(11 - pos, found):
+            index -= _choose(11 - pos, found)
+            ep[pos] = SLICE_EDGES[4 - found]
+            found -= 1
+    others = [e for e in range(12) if e not in SLICE_EDGES]
+    for pos in range(12):
+        if ep[pos] is None:
+            ep[pos] = others.pop(0)
+    return ep
+
+
+def coords(state):
+    """
+    Return all coordinates (twist, flip, slice, corner, edge8, sliceperm)
+    of a cubie state.  The last two are only meaningful in G1.
+    """
+    (cp, co, ep, eo) = state
+    edge8 = [e for e in ep[:8]]
+    sliceperm = [e - 8 for e in ep[8:]]
+    if all(e < 8 for e in edge8):
+        edge8_index = cubies.perm_to_index(edge8)
+        sliceperm_index = cubies.perm_to_index(sliceperm)
+    else:
+        edge8_index = sliceperm_index = None
+    return (cubies.twist_to_index(co), cubies.flip_to_index(eo),
+            slice_coord(ep), cubies.perm_to_index(cp),
+            edge8_index, sliceperm_index)
+
+
+def check_cubies(state):
+    """
+    Raise InvalidCube unless a cubie state can be reached by face moves.
+    """
+    (cp, co, ep, eo) = state
+    if sorted(cp) != list(range(8)) or sorted(ep) != list(range(12)):
+        raise InvalidCube('A cubie appears twice on the cube.')
+    if sum(co) % 3 != 0:
+        raise InvalidCube('A corner of the cube is twisted.')
+    if sum(eo) % 2 != 0:
+        raise InvalidCube('An edge of the cube is flipped.')
+    if cubies.parity(cp) != cubies.parity(ep):
+        raise InvalidCube('Two cubies of the cube are swapped.')
+
+
+def _turns():
+    """
+    Return the cubie action of each of the 18 moves, in MOVES order.
+    """
+    actions = cubies.cubie_moves(3)
+    turns = []
+    for face in MOVE_FACES:
+        quarter = actions[face + '+']
+        turns.append([quarter])
+        turns.append([quarter, quarter])
+        turns.append([actions[face + '-']])
+    return turns
+
+
+def _apply(state, turn):
+    """
+    Apply one of the 18 moves, given by its entry of _turns().
+    """
+    for action in turn:
+        state = cubies.move_cubies(state, action)
+    return state
+
+
+# Table generation.
+
+def _build_move_tables():
+    """
+    Return the move tables as a dictionary of array objects, indexed by
+    coordinate * NMOVES + move.
+    """
+    turns = _turns()
+    solved = (list(range(8)), [0] * 8, list(range(12)), [0] * 12)
+    tables = {}
+
+    twist = array.array('H')
+    for index in range(NTWIST):
+        state = (solved[0], cubies.index_to_twist(index, 8),
+                 solved[2], solved[3])
+        for turn in turns:
+            twist.append(cubies.twist_to_index(_apply(state, turn)[1]))
+    tables['twist_move'] = twist
+
+    flip = array.array('H')
+    for index in range(NFLIP):
+        state = (solved[0], solved[1], solved[2],
+                 cubies.index_to_flip(index, 12))
+        for turn in turns:
+            flip.append(cubies.flip_to_index(_apply(state, turn)[3]))
+    tables['flip_move'] = flip
+
+    slc = array.array('H')
+    for index in range(NSLICE):
+        state = (solved[0], solved[1], slice_edges(index), solved[3])
+        for turn in turns:
+            slc.append(slice_coord(_apply(state, turn)[2]))
+    tables['slice_move'] = slc
+
+    corner = array.array('H')
+    for index in range(NCORNER):
+        state = (cubies.index_to_perm(index, 8), solved[1],
+                 solved[2], solved[3])
+        for turn in turns:
+            corner.append(cubies.perm_to_index(_apply(state, turn)[0]))
+    tables['corner_move'] = corner
+
+    # The U/D edge and slice permutations only exist in G1, so moves that
+    # leave G1 are given the value 0; the search never uses them.
+    edge8 = array.array('H')
+    for index in range(NEDGE8):
+        state = (solved[0], solved[1],
+                 cubies.index_to_perm(index, 8) + solved[2][8:], solved[3])
+        for (m, turn) in enumerate(turns):
+            if m in PHASE2_MOVES:
+                edge8.append(cubies.perm_to_index(_apply(state, turn)[2][:8]))
+            else:
+                edge8.append(0)
+    tables['edge8_move'] = edge8
+
+    sliceperm = array.array('H')
+    for index in range(NSLICEPERM):
+        perm = cubies.index_to_perm(index, 4)
+        state = (solved[0], solved[1],
+                 solved[2][:8] + [e + 8 for e in perm], solved[3])
+        for (m, turn) in enumerate(turns):
+            if m in PHASE2_MOVES:
+                ep = _apply(state, turn)[2]
+                sliceperm.append(
+                    cubies.perm_to_index([e - 8 for e in ep[8:]]))
+            else:
+                sliceperm.append(0)
+    tables['sliceperm_move'] = sliceperm
+    return tables
+
+
+def _build_prune(size1, move1, size2, move2, moves):
+    """
+    Return a pruning table for the pair of coordinates (c1, c2), indexed
+    by c1 * size2 + c2 and holding the number of moves needed to bring
+    both coordinates to 0, found by breadth-first search.
+    """
+    unseen = 255
+    prune = bytearray([unseen]) * (size1 * size2)
+    prune[0] = 0
+    frontier = [0]
+    depth = 0
+    while frontier:
+        depth += 1
+        nxt = []
+        for index in frontier:
+            (c1, c2) = divmod(index, size2)
+            base1 = c1 * NMOVES
+            base2 = c2 * NMOVES
+            for m in moves:
+                new = move1[base1 + m] * size2 + move2[base2 + m]
+                if prune[new] == unseen:
+                    prune[new] = depth
+                    nxt.append(new)
+        frontier = nxt
+    return prune
+
+
+def build_tables(table_dir):
+    """
+    Generate all move and pruning tables and save them in a directory.
+    """
+    tables = _build_move_tables()
+    all_moves = list(range(NMOVES))
+    tables['slice_twist_prune'] = _build_prune(
+        NSLICE, tables['slice_move'], NTWIST, tables['twist_move'],
+        all_moves)
+    tables['slice_flip_prune'] = _build_prune(
+        NSLICE, tables['slice_move'], NFLIP, tables['flip_move'], all_moves)
+    tables['corner_prune'] = _build_prune(
+        NCORNER, tables['corner_move'], NSLICEPERM,
+        tables['sliceperm_move'], PHASE2_MOVES)
+    tables['edge8_prune'] = _build_prune(
+        NEDGE8, tables['edge8_move'], NSLICEPERM, tables['sliceperm_move'],
+        PHASE2_MOVES)
+    os.makedirs(table_dir, exist_ok=True)
+    for name in TABLES:
+        filename = _table_file(table_dir, name)
+        # Write to a temporary file first so a partial table is never used.
+        with open(filename + '.tmp', 'wb') as outfile:
+            outfile.write(bytes(tables[name]))
+        os.replace(filename + '.tmp', filename)
+
+
+def _table_file(table_dir, name):
+    """
+    Return the file name of a table.
+    """
+    return os.path.join(table_dir, f'solve3_v{TABLE_VERSION}_{name}.bin')
+
+
+def _load_table(table_dir, name):
+    """
+    Memory-map a saved table and return it as a memoryview.
+    """
+    (typecode, length) = TABLES[name]
+    with open(_table_file(table_dir, name), 'rb') as infile:
+        data = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(data).cast(typecode)
+    assert len(view) == length
+    return view
+
+
+class Solver3:
+    """
+    This class solves 3x3x3 cubes with Kociemba's two-phase algorithm.
+    """
+
+    def __init__(self, table_dir=None):
+        """
+        Load the tables, generating them first if they are missing.
+
+        Argument:
+            table_dir (str) - the table directory;
+                              rubiks_cubies.TABLE_DIR by default
+        """
+        if table_dir is None:
+            table_dir = cubies.TABLE_DIR
+        if not all(os.path.exists(_table_file(table_dir, name))
+                   for name in TABLES):
+            build_tables(table_dir)
+        for name in TABLES:
+            setattr(self, name, _load_table(table_dir, name))
+        self.turns = _turns()
+        # allowed[last] lists the moves that may follow move 'last' (or
+        # any move at the start, last == NMOVES): never the same face
+        # twice, and opposite faces only in the order U/D, R/L, F/B.
+        self.allowed = []
+        for last in range(NMOVES + 1):
+            moves = []
+            for m in range(NMOVES):
+                if last < NMOVES:
+                    (face, last_face) = (m // 3, last // 3)
+                    if face == last_face or face == last_face - 3:
+                        continue
+                moves.append(m)
+            self.allowed.append(moves)
+
+    def solve_cubies(self, state, max_length=24, timeout=0.2):
+        """
+        Return the shortest solution found for a cubie state, as a list of
+        move indices into MOVES.
+
+        Arguments:
+          state (tuple) - cubie state (cp, co, ep, eo)
+          max_length (int) - longest solution to accept
+          timeout (float) - seconds to keep looking for shorter solutions
+                            once one has been found
+
+        Return value: a list of move indices, or None if there is no
+        solution of at most max_length moves.
+        """
+        check_cubies(state)
+        (twist, flip, slc, _, _, _) = coords(state)
+        self.state = state
+        self.best = None
+        self.max_length = max_length
+        self.deadline = time.time() + timeout
+        self.path = []
+        start = max(self.slice_twist_prune[slc * NTWIST + twist],
+                    self.slice_flip_prune[slc * NFLIP + flip])
+        for depth in range(start, max_length + 1):
+            if self.best is not None and \
+                    (depth >= len(self.best) or time.time() > self.deadline):
+                break
+            self._phase1(twist, flip, slc, depth, NMOVES)
+        return self.best
+
+    def _phase1(self, twist, flip, slc, togo, last):
+        """
+        Search phase 1 to exactly 'togo' more moves.
+        Return True when the search should stop.
+        """
+        if togo == 0:
+            # A phase 1 solution ending in a G1 move is a shorter phase 1
+            # solution followed by phase 2 moves, already searched.
+            if last == NMOVES or last not in PHASE2_MOVES:
+                return self._start_phase2()
+            return False
+        for m in self.allowed[last]:
+            new_twist = self.twist_move[twist * NMOVES + m]
+            new_flip = self.flip_move[flip * NMOVES + m]
+            new_slc = self.slice_move[slc * NMOVES + m]
+            if self.slice_twist_prune[new_slc * NTWIST + new_twist] >= togo:
+                continue
+            if self.slice_flip_prune[new_slc * NFLIP + new_flip] >= togo:
+                continue
+            self.path.append(m)
+            stop = self._phase1(new_twist, new_flip, new_slc, togo - 1, m)
+            self.path.pop()
+            if stop:
+                return True
+        return False
+
+    def _start_phase2(self):
+        """
+        Run phase 2 from the end of the current phase 1 path.
+        Return True when the search should stop.
+        """
+        state = self.state
+        for m in self.path:
+            state = _apply(state, self.turns[m])
+        (_, _, _, corner, edge8, sliceperm) = coords(state)
+        if self.best is None:
+            limit = self.max_length - len(self.path)
+        else:
+            limit = len(self.best) - 1 - len(self.path)
+        limit = min(limit, MAX_PHASE2)
+        start = max(self.corner_prune[corner * NSLICEPERM + sliceperm],
+                    self.edge8_prune[edge8 * NSLICEPERM + sliceperm])
+        last = self.path[-1] if self.path else NMOVES
+        self.phase1_length = len(self.path)
+        for depth in range(start, limit + 1):
+            if self._phase2(corner, edge8, sliceperm, depth, last):
+                self.best = list(self.path)
+                break
+        # Drop any partial phase 2 path.
+        del self.path[self.phase1_length:]
+        return self.best is not None and time.time() > self.deadline
+
+    def _phase2(self, corner, edge8, sliceperm, togo, last):
+        """
+        Search phase 2 to exactly 'togo' more moves.
+        Return True when a solution is found (left in self.path).
+        """
+        if togo == 0:
+            return corner == 0 and edge8 == 0 and sliceperm == 0
+        for m in self.allowed[last]:
+            if m not in PHASE2_MOVES:
+                continue
+            new_corner = self.corner_move[corner * NMOVES + m]
+            new_edge8 = self.edge8_move[edge8 * NMOVES + m]
+            new_sliceperm = self.sliceperm_move[sliceperm * NMOVES + m]
+            if self.corner_prune[new_corner * NSLICEPERM +
+                                 new_sliceperm] >= togo:
+                continue
+            if self.edge8_prune[new_edge8 * NSLICEPERM +
+                                new_sliceperm] >= togo:
+                continue
+            self.path.append(m)
+            if self._phase2(new_corner, new_edge8, new_sliceperm,
+                            togo - 1, m):
+                return True
+            self.path.pop()
+        return False
+
+    def solve(self, cube, max_length=24, timeout=0.2):
+        """
+        Solve a 3x3x3 RubiksCube.
+
+        Arguments:
+          cube (RubiksCube) - the cube to solve; it is not changed.
+          max_length (int) - longest solution to accept, in face turns
+          timeout (float) - seconds to keep looking for shorter solutions
+                            once one has been found
+
+        Return value: a list of RubiksControl commands (a half turn is two
+        quarter-turn commands), or None if no solution was found.
+        """
+        assert cube.rep.size == 3
+        return self.solve_facelets(cubies.cube_facelets(cube), max_length,
+                                   timeout)
+
+    def solve_facelets(self, facelets, max_length=24, timeout=0.2):
+        """
+        Solve a 3x3x3 cube given by its facelets (see solve).
+        The cube may be in any orientation: colors are read relative to
+        the centers, so no whole-cube rotations are needed.
+        """
+        facelets = relabel(facelets)
+        state = cubies.to_cubies(3, facelets)
+        moves = self.solve_cubies(state, max_length, timeout)
+        if moves is None:
+            return None
+        return to_commands(moves)
+
+
+def relabel(facelets):
+    """
+    Recolor the facelets of a 3x3x3 cube so each face's center has that
+    face's own color code.
+    """
+    codes = {}
+    for face in range(len(cubies.FACES)):
+        codes[facelets[face * 9 + 4]] = face
+    if len(codes) != len(cubies.FACES):
+        raise InvalidCube('Your cube does not contain all six colors.')
+    return bytes(codes[code] for code in facelets)
+
+
+def to_commands(moves):
+    """
+    Turn a list of move indices into RubiksControl commands.
+    """
+    cmds = []
+    for m in moves:
+        (face, turn) = MOVES[m]
+        cmd = face.lower()
+        if turn == '1':
+            cmds.append(cmd)
+        elif turn == '2':
+            cmds.extend([cmd, cmd])
+        else:
+            cmds.append(cmd + "'")
+    return cmds
+
+
+# Solving many cubes at once.
+
+_worker_solver = None
+
+
+def _init_worker(table_dir):
+    """
+    Load the tables once in each worker process.
+    """
+    global _worker_solver
+    _worker_solver = Solver3(table_dir)
+
+
+def _solve_in_worker(args):
+    """
+    Solve one cube in a worker process.
+    """
+    (facelets, max_length, timeout) = args
+    return _worker_solver.solve_facelets(facelets, max_length, timeout)
+
+
+def solve_many(cubes, processes=None, max_length=24, timeout=0.2,
+               table_dir=None):
+    """
+    Solve a list of 3x3x3 RubiksCubes across a pool of processes.
+
+    Arguments:
+      cubes (list) - the cubes to solve; they are not changed.
+      processes (int) - number of worker processes (all cores by default)
+      max_length, timeout - as for Solver3.solve
+      table_dir (str) - the table directory;
+                        rubiks_cubies.TABLE_DIR by default
+
+    Return value: a list with one solution per cube, in the same order.
+    """
+    if table_dir is None:
+        table_dir = cubies.TABLE_DIR
+    # Build the tables once here rather than in every worker.
+    Solver3(table_dir)
+    jobs = [(cubies.cube_facelets(cube), max_length, timeout)
+            for cube in cubes]
+    with multiprocessing.Pool(processes, _init_worker, (table_dir,)) as pool:
+        return pool.map(_solve_in_worker, jobs)
+
+
+if __name__ == '__main__':
+    from rubiks_cube import RubiksCube
+    solver = Solver3()
+    cube = RubiksCube(3)
+    cube.scramble()
+    print(cube.display())
+    print(' '.join(solver.solve(cube)))
@@ -0,0 +1,167 @@
+"""
+Thierno Diallo
+tdiallo@caltech.edu
+
+Instrumentation of the Rubik's cube engines.
+
+While recording, the primitive operations of RubiksRep, RubiksFlatRep
+and RubiksCube are replaced by wrappers that count calls, stickers copied
+(from the representation's 'touched' counter) and time spent.  The
+original methods are put back when recording stops, so there is no cost
+at all when it is off.  Counts include any primitives called from inside
+a primitive, so move_face also counts the _get_row calls it makes.
+
+Recording is process wide, since it replaces the methods of the classes:
+while it is on, the primitives of every cube in the process are counted,
+into the single Stats object recording was started with.
+"""
+
+import contextlib  # contextlib.contextmanager for record()
+import functools   # functools.wraps for the wrappers
+import time        # time.perf_counter for timing
+from rubiks_rep import RubiksRep
+from rubiks_flat import RubiksFlatRep
+from rubiks_cube import RubiksCube
+
+# The methods that are instrumented, for each class that defines them.
+PRIMITIVES = {
+    RubiksRep: ['get_row', 'get_col', 'set_row', 'set_col',
+                'rotate_face_cw', 'rotate_face_ccw', '_get_row', '_get_col',
+                '_set_row', '_set_col', '_turn_cw', '_turn_ccw', 'move_face',
+                'move_layer', 'move_front', 'rotate_cube', 'rotate_cube_x',
+                'rotate_cube_y', 'rotate_cube_z', 'materialize',
+                'apply_perm', 'get_face', 'is_solved', 'display'],
+    RubiksFlatRep: ['apply_move', 'apply_perm', 'move_face', 'move_layer',
+                    'turn_face', 'move_front', 'rotate_cube',
+                    'rotate_cube_x', 'rotate_cube_y', 'rotate_cube_z',
+                    'get_face', 'is_solved', 'display'],
+    RubiksCube: ['move_face', 'move_layers', 'rotate_cube', 'apply_perm',
+                 'is_solved', 'get_state', 'display'],
+}
+
+# The original methods and the Stats object recorded into, while
+# recording.
+_saved = []
+_stats = None
+
+
+class Stats:
+    """
+    Counts of calls, stickers copied and seconds spent per primitive.
+    """
+
+    def __init__(self):
+        """
+        Start with no counts.
+        """
+        # Maps names like 'RubiksRep.get_row' to [calls, copied, seconds].
+        self.counts = {}
+
+    def reset(self):
+        """
+        Forget all counts.
+        """
+        self.counts = {}
+
+    def report(self):
+        """
+        Return the counts as a table, one primitive per line, busiest
+        first.
+        """
+        lines = [f'{"primitive":28} {"calls":>10} {"copied":>12} '
+                 f'{"seconds":>10}']
+        entries = sorted(self.counts.items(), key=lambda item: -item[1][2])
+        for (name, (calls, copied, seconds)) in entries:
+            lines.append(f'{name:28} {calls:10} {copied:12} {seconds:10.4f}')
+        return '\n'.join(lines)
+
+
+def _wrap(stats, name, method):
+    """
+    Return a wrapper of a method that adds to the counts of 'name'.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        # RubiksCube keeps its sticker counter in its representation.
+        rep = getattr(self, 'rep', self)
+        before = rep.touched
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            if name not in stats.counts:
+                stats.counts[name] = [0, 0, 0.0]
+            entry = stats.counts[name]
+            entry[0] += 1
+            entry[1] += rep.touched - before
+            entry[2] += seconds
+    return wrapper
+
+
+def start(stats):
+    """
+    Start recording into a Stats object.
+    """
+    global _stats
+    assert _saved == [], 'Already recording.'
+    _stats = stats
+    for (cls, names) in PRIMITIVES.items():
+        for name in names:
+            if name in cls.__dict__:
+                method = cls.__dict__[name]
+                _saved.append((cls, name, method))
+                setattr(cls, name,
+                        _wrap(stats, f'{cls.__name__}.{name}', method))
+
+
+def stop():
+    """
+    Stop recording, putting the original methods back.
+    """
+    global _stats
+    _stats = None
+    while _saved:
+        (cls, name, method) = _saved.pop()
+        setattr(cls, name, method)
+
+
+def recording():
+    """
+    Return True if recording is on.
+    """
+    return _saved != []
+
+
+def current():
+    """
+    Return the Stats object being recorded into, or None if recording is
+    off.
+    """
+    return _stats
+
+
+@contextlib.contextmanager
+def record(stats=None):
+    """
+    Record while in a 'with' block, e.g.
+
+        with rubiks_stats.record() as stats:
+            cube.scramble()
+        print(stats.report())
+    """
+    if stats is None:
+        stats = Stats()
+    start(stats)
+    try:
+        yield stats
+    finally:
+        stop()
+
+
+if __name__ == '__main__':
+    cube = RubiksCube(3)
+    with record() as stats:
+        cube.scramble()
+        cube.is_solved()
+    print(stats.report())
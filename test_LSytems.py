@@ -0,0 +1,42 @@
+"""
+Tests of the analytic bounds of L-system drawings against the bounds of
+the drawing commands themselves.
+"""
+
+import math
+import LSytems
+
+
+def brute_force_bounds(lsys, draw, n):
+    """
+    Return the bounds of level n of an L-system from its drawing commands.
+    """
+    cmds = LSytems.lsystem_to_drawing_commands(draw, LSytems.expand(lsys, n))
+    return LSytems.bounds(cmds)
+
+
+def check_bounds(lsys, draw, levels):
+    for n in levels:
+        expected = brute_force_bounds(lsys, draw, n)
+        found = LSytems.lsystem_bounds(lsys, draw, n)
+        for (a, b) in zip(found, expected):
+            assert math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9), (n, found,
+                                                                   expected)
+
+
+def test_hilbert_bounds():
+    check_bounds(LSytems.hilbert, LSytems.hilbert_draw, range(0, 7))
+
+
+def test_koch_bounds():
+    check_bounds(LSytems.koch, LSytems.koch_draw, range(0, 6))
+
+
+def test_sierpinski_bounds():
+    check_bounds(LSytems.sierpinski, LSytems.sierpinski_draw, range(0, 7))
+
+
+def test_deep_bounds_are_fast():
+    (xmin, xmax, ymin, ymax) = LSytems.lsystem_bounds(LSytems.koch,
+                                                     LSytems.koch_draw, 30)
+    assert math.isclose(xmax - xmin, 3 ** 30, rel_tol=1e-6)